@@ -1,34 +1,140 @@
 import os 
-from typing import Annotated, List, Tuple, Union
+from typing import Annotated, AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Union
 from typing_extensions import TypedDict
 import operator
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable, RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
 from langgraph.prebuilt import ToolNode
 from langgraph.checkpoint.memory import MemorySaver
+from checkpoints import DEFAULT_CHECKPOINT_PATH, CheckpointStore
+from events import (
+    ResearchEvent, RunResult, run_error, run_result, run_started, stage_finished, stage_started, token_delta
+)
+from llm_cache import ResponseCache, cached_chain
+from scheduler import CallScheduler, get_scheduler
+from stage_models import StageModel, behind_budget, resolve_stage_models, stage_models_key
+from telemetry import make_span
+from collections import OrderedDict
+import asyncio
 import functools
+import inspect
+import hashlib
+import re
+import threading
+import time
+import uuid
+from message_store import (
+    DEFAULT_CONTEXT_BUDGETS, add_counts, append_messages, compact_messages, prompt_tokens
+)
 
-def create_llm(temperature: float = 0.1, model: str = "gemini-2.5-flash") -> ChatGoogleGenerativeAI:
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_TEMPERATURE = 0.1
+
+def create_llm(temperature: float = DEFAULT_TEMPERATURE, model: str = DEFAULT_MODEL,
+               api_key: Optional[str] = None) -> ChatGoogleGenerativeAI:
     """Create a Google Gemini LLM instance."""
-    api_key = os.getenv("GOOGLE_API_KEY")
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("Google API key not found in environment")
     return ChatGoogleGenerativeAI(
         model=model, 
         temperature=temperature,
-        api_key=api_key
+        api_key=api_key,
+        # Retries are left to the scheduler, which backs off across all callers (0 would mean the SDK default)
+        max_retries=1
+    )
+
+class BoundedRegistry:
+    """Thread-safe LRU map of expensive objects shared by every session in the process."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, factory: Callable):
+        """Return the object stored under key, building it with factory on a miss."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            value = factory()
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+# Warm Gemini clients and compiled graphs, keyed by model, temperature and API key
+llm_registry = BoundedRegistry(max_size=16)
+app_registry = BoundedRegistry(max_size=8)
+checkpoint_stores = BoundedRegistry(max_size=4)
+response_caches = BoundedRegistry(max_size=4)
+
+def get_checkpoint_store(db_path: str = DEFAULT_CHECKPOINT_PATH) -> CheckpointStore:
+    """Return the process-wide durable checkpoint store for db_path."""
+    return checkpoint_stores.get_or_create(db_path, lambda: CheckpointStore(db_path))
+
+def get_response_cache(db_path: str) -> ResponseCache:
+    """Return the process-wide LLM response cache for db_path."""
+    return response_caches.get_or_create(db_path, lambda: ResponseCache(db_path))
+
+def _key_digest(api_key: Optional[str]) -> str:
+    """Registry keys hold a digest so raw API keys never end up in cache keys."""
+    api_key = api_key or os.getenv("GOOGLE_API_KEY") or ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def get_llm(temperature: float = DEFAULT_TEMPERATURE, model: str = DEFAULT_MODEL,
+            api_key: Optional[str] = None) -> ChatGoogleGenerativeAI:
+    """Return a shared LLM client, creating it on first use."""
+    return llm_registry.get_or_create(
+        (model, temperature, _key_digest(api_key)),
+        lambda: create_llm(temperature=temperature, model=model, api_key=api_key)
     )
 
+def stage_llm(model: str, temperature: float, api_key: Optional[str] = None, llm: Optional[BaseChatModel] = None,
+              base: Tuple[str, float] = (DEFAULT_MODEL, DEFAULT_TEMPERATURE)) -> BaseChatModel:
+    """Client for one stage's model settings. A custom llm stands in for the base settings; others get a copy of it."""
+    if llm is None:
+        return get_llm(temperature=temperature, model=model, api_key=api_key)
+    if (model, temperature) == base:
+        return llm
+    return llm.model_copy(update={"model": model, "temperature": temperature})
+
 class AgentState(TypedDict):
     """State shared between all agents in the graph."""
-    messages: Annotated[list, operator.add]
+    messages: Annotated[list, append_messages]
     next: str
     current_agent: str
     research_topic: str
     findings: dict
     final_report: str
+    # Prompt tokens sent by each stage over the run
+    prompt_tokens: Annotated[dict, add_counts]
+    # Fan-out research: planned sub-questions and the findings of each branch
+    sub_questions: list
+    research_partials: Annotated[list, operator.add]
+    # Stages that hit an error, in order; a resumed run restarts from the first
+    failed_stages: Annotated[list, operator.add]
+    # telemetry.Span per agent node and supervisor decision
+    spans: Annotated[list, operator.add]
+
+class SubQuestionTask(TypedDict):
+    """Input sent to each parallel research branch."""
+    research_topic: str
+    sub_question: str
+    index: int
 
 class AgentResponse(TypedDict):
     """Standard response format for all agents."""
@@ -36,7 +142,53 @@ class AgentResponse(TypedDict):
     next_agent: str
     findings: dict
 
-def create_research_agent(llm: ChatGoogleGenerativeAI) -> callable:
+def chain_node(name: str, chain: Runnable, build_inputs: Callable, on_response: Callable,
+               on_error: Callable, fallback: Optional[Runnable] = None) -> Runnable:
+    """Wrap a prompt | llm chain as a graph node with blocking and async paths.
+
+    build_inputs(state) returns the chain inputs, on_response(state, inputs, response)
+    and on_error(state, error) return the node's state update. Each call also
+    adds a telemetry span with its wall time, tokens and error. fallback, the
+    same prompt on a cheaper model, runs instead of chain once the run is
+    behind its latency budget.
+    """
+
+    def pick(config) -> Runnable:
+        return fallback if fallback is not None and behind_budget(name, config) else chain
+
+    def node(state, config):
+        inputs = build_inputs(state)
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            response = pick(config).invoke(inputs)
+        except Exception as e:
+            return {**on_error(state, e), "spans": [make_span(name, state, config, started_at, start, error=e)]}
+        return {**on_response(state, inputs, response),
+                "spans": [make_span(name, state, config, started_at, start, response)]}
+
+    async def anode(state, config):
+        inputs = build_inputs(state)
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            response = await pick(config).ainvoke(inputs)
+        except Exception as e:
+            return {**on_error(state, e), "spans": [make_span(name, state, config, started_at, start, error=e)]}
+        return {**on_response(state, inputs, response),
+                "spans": [make_span(name, state, config, started_at, start, response)]}
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+def _parse_key_areas(text: str, limit: int = 5) -> List[str]:
+    """Section headings of the researcher's reply, or its top-level bullet points if it has none."""
+    headings = re.findall(r"^[ \t]{0,3}#{1,6}[ \t]+(.+?)[ \t#]*$", text, re.MULTILINE)
+    areas = headings or re.findall(r"^(?:\d+[.)]|[-*+•])[ \t]+(.+?)[ \t]*$", text, re.MULTILINE)
+    return [re.sub(r"(\*\*|__)(.+?)\1", r"\2", area).strip("*_: ") for area in areas][:limit]
+
+def create_research_agent(llm: ChatGoogleGenerativeAI,
+                          context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGETS["researcher"],
+                          response_cache: Optional[ResponseCache] = None,
+                          scheduler: Optional[CallScheduler] = None,
+                          fallback_llm: Optional[BaseChatModel] = None) -> Runnable:
     """Creates a research specialist agent for initial data gathering"""
    
     research_prompt = ChatPromptTemplate.from_messages([
@@ -53,45 +205,53 @@ def create_research_agent(llm: ChatGoogleGenerativeAI) -> callable:
         ("human", "Research Topic: {research_topic}")
     ])
    
-    research_chain = research_prompt | llm
+    research_chain = cached_chain("researcher", research_prompt, llm, response_cache, scheduler)
+    research_fallback = (cached_chain("researcher", research_prompt, fallback_llm, response_cache, scheduler)
+                         if fallback_llm else None)
    
-    def research_agent(state: AgentState) -> AgentState:
-        """Execute research analysis"""
-        try:
-            response = research_chain.invoke({
-                "messages": state["messages"],
-                "research_topic": state["research_topic"]
-            })
-           
-            findings = {
-                "research_overview": response.content,
-                "key_areas": ["area1", "area2", "area3"],
-                "initial_insights": response.content[:500] + "..."
-            }
-           
-            return {
-                "messages": state["messages"] + [AIMessage(content=response.content)],
-                "next": "analyst",
-                "current_agent": "researcher",
-                "research_topic": state["research_topic"],
-                "findings": {**state.get("findings", {}), "research": findings},
-                "final_report": state.get("final_report", "")
-            }
-           
-        except Exception as e:
-            error_msg = f"Research agent error: {str(e)}"
-            return {
-                "messages": state["messages"] + [AIMessage(content=error_msg)],
-                "next": "analyst",
-                "current_agent": "researcher",
-                "research_topic": state["research_topic"],
-                "findings": state.get("findings", {}),
-                "final_report": state.get("final_report", "")
-            }
+    def build_inputs(state: AgentState) -> dict:
+        return {
+            "messages": compact_messages(state["messages"], context_budget),
+            "research_topic": state["research_topic"]
+        }
+   
+    def on_response(state: AgentState, inputs: dict, response) -> AgentState:
+        """Record research findings"""
+        findings = {
+            "research_overview": response.content,
+            "key_areas": _parse_key_areas(response.content),
+            "initial_insights": response.content[:500] + "..."
+        }
+       
+        return {
+            "messages": [AIMessage(content=response.content)],
+            "next": "analyst",
+            "current_agent": "researcher",
+            "research_topic": state["research_topic"],
+            "findings": {**state.get("findings", {}), "research": findings},
+            "final_report": state.get("final_report", ""),
+            "prompt_tokens": {"researcher": prompt_tokens(response, inputs["messages"])}
+        }
    
-    return research_agent
+    def on_error(state: AgentState, e: Exception) -> AgentState:
+        error_msg = f"Research agent error: {str(e)}"
+        return {
+            "messages": [AIMessage(content=error_msg)],
+            "next": "analyst",
+            "current_agent": "researcher",
+            "research_topic": state["research_topic"],
+            "findings": state.get("findings", {}),
+            "final_report": state.get("final_report", ""),
+            "failed_stages": ["researcher"]
+        }
+   
+    return chain_node("researcher", research_chain, build_inputs, on_response, on_error, research_fallback)
 
-def create_analyst_agent(llm: ChatGoogleGenerativeAI) -> callable:
+def create_analyst_agent(llm: ChatGoogleGenerativeAI,
+                         context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGETS["analyst"],
+                         response_cache: Optional[ResponseCache] = None,
+                         scheduler: Optional[CallScheduler] = None,
+                         fallback_llm: Optional[BaseChatModel] = None) -> Runnable:
     """Creates an analyst agent for deep data analysis."""
     analyst_prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a Data Analyst AI. Your role is to:
@@ -107,43 +267,53 @@ def create_analyst_agent(llm: ChatGoogleGenerativeAI) -> callable:
         ("human", "Analyze the research findings for : {research_topic}")
     ])
 
-    analyst_chain = analyst_prompt | llm
+    analyst_chain = cached_chain("analyst", analyst_prompt, llm, response_cache, scheduler)
+    analyst_fallback = (cached_chain("analyst", analyst_prompt, fallback_llm, response_cache, scheduler)
+                        if fallback_llm else None)
 
-    def analyst_agent(state: AgentState) -> AgentState:
-        """Execute Data Analysis"""
-        try:
-            response = analyst_chain.invoke({
-                "messages": state["messages"],
-                "research_topic": state["research_topic"]
-            })
-            
-            analysis_findings = {
-                "analysis_summary": response.content,
-                "key_metrics": ["metric1", "metric2", "metric3"],
-                "recommendations": response.content.split("recommendations:")
-            }
-            return {
-                "messages": state["messages"] + [AIMessage(content=response.content)],
-                "next": "writer",
-                "current_agent": "analyst",
-                "research_topic": state["research_topic"],
-                "findings": {**state.get("findings", {}), "analysis": analysis_findings},
-                "final_report": state.get("final_report", "")
-            }
-        except Exception as e:
-            error_msg = f"Analyst Agent Error: {str(e)}"
-            return {
-                "messages": state["messages"] + [AIMessage(content=error_msg)],
-                "next": "writer",
-                "current_agent": "analyst",
-                "research_topic": state["research_topic"],
-                "findings": state.get("findings", {}),
-                "final_report": state.get("final_report", "")
-            }
-    return analyst_agent
-
-
-def create_writer_agent(llm: ChatGoogleGenerativeAI) -> callable:
+    def build_inputs(state: AgentState) -> dict:
+        return {
+            "messages": compact_messages(state["messages"], context_budget),
+            "research_topic": state["research_topic"]
+        }
+
+    def on_response(state: AgentState, inputs: dict, response) -> AgentState:
+        """Record analysis findings"""
+        analysis_findings = {
+            "analysis_summary": response.content,
+            "key_metrics": ["metric1", "metric2", "metric3"],
+            "recommendations": response.content.split("recommendations:")
+        }
+        return {
+            "messages": [AIMessage(content=response.content)],
+            "next": "writer",
+            "current_agent": "analyst",
+            "research_topic": state["research_topic"],
+            "findings": {**state.get("findings", {}), "analysis": analysis_findings},
+            "final_report": state.get("final_report", ""),
+            "prompt_tokens": {"analyst": prompt_tokens(response, inputs["messages"])}
+        }
+
+    def on_error(state: AgentState, e: Exception) -> AgentState:
+        error_msg = f"Analyst Agent Error: {str(e)}"
+        return {
+            "messages": [AIMessage(content=error_msg)],
+            "next": "writer",
+            "current_agent": "analyst",
+            "research_topic": state["research_topic"],
+            "findings": state.get("findings", {}),
+            "final_report": state.get("final_report", ""),
+            "failed_stages": ["analyst"]
+        }
+
+    return chain_node("analyst", analyst_chain, build_inputs, on_response, on_error, analyst_fallback)
+
+
+def create_writer_agent(llm: ChatGoogleGenerativeAI,
+                        context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGETS["writer"],
+                        response_cache: Optional[ResponseCache] = None,
+                        scheduler: Optional[CallScheduler] = None,
+                        fallback_llm: Optional[BaseChatModel] = None) -> Runnable:
     """Creates a report writer agent for final documentation"""
    
     writer_prompt = ChatPromptTemplate.from_messages([
@@ -160,40 +330,197 @@ def create_writer_agent(llm: ChatGoogleGenerativeAI) -> callable:
         ("human", "Create a comprehensive report for: {research_topic}")
     ])
    
-    writer_chain = writer_prompt | llm
+    writer_chain = cached_chain("writer", writer_prompt, llm, response_cache, scheduler)
+    writer_fallback = (cached_chain("writer", writer_prompt, fallback_llm, response_cache, scheduler)
+                       if fallback_llm else None)
    
-    def writer_agent(state: AgentState) -> AgentState:
-        """Execute report writing"""
-        try:
-            response = writer_chain.invoke({
-                "messages": state["messages"],
-                "research_topic": state["research_topic"]
-            })
-           
-            return {
-                "messages": state["messages"] + [AIMessage(content=response.content)],
-                "next": "supervisor",
-                "current_agent": "writer",
-                "research_topic": state["research_topic"],
-                "findings": state.get("findings", {}),
-                "final_report": response.content
-            }
-           
-        except Exception as e:
-            error_msg = f"Writer agent error: {str(e)}"
-            return {
-                "messages": state["messages"] + [AIMessage(content=error_msg)],
-                "next": "supervisor",
-                "current_agent": "writer",
-                "research_topic": state["research_topic"],
-                "findings": state.get("findings", {}),
-                "final_report": f"Error generating report: {str(e)}"
-            }
+    def build_inputs(state: AgentState) -> dict:
+        return {
+            "messages": compact_messages(state["messages"], context_budget),
+            "research_topic": state["research_topic"]
+        }
    
-    return writer_agent
+    def on_response(state: AgentState, inputs: dict, response) -> AgentState:
+        """Record the final report"""
+        return {
+            "messages": [AIMessage(content=response.content)],
+            "next": "supervisor",
+            "current_agent": "writer",
+            "research_topic": state["research_topic"],
+            "findings": state.get("findings", {}),
+            "final_report": response.content,
+            "prompt_tokens": {"writer": prompt_tokens(response, inputs["messages"])}
+        }
+   
+    def on_error(state: AgentState, e: Exception) -> AgentState:
+        error_msg = f"Writer agent error: {str(e)}"
+        return {
+            "messages": [AIMessage(content=error_msg)],
+            "next": "supervisor",
+            "current_agent": "writer",
+            "research_topic": state["research_topic"],
+            "findings": state.get("findings", {}),
+            "final_report": f"Error generating report: {str(e)}",
+            "failed_stages": ["writer"]
+        }
+   
+    return chain_node("writer", writer_chain, build_inputs, on_response, on_error, writer_fallback)
+
+def _parse_sub_questions(text: str, limit: int) -> List[str]:
+    """Pull numbered or bulleted lines out of the planner's reply."""
+    questions = []
+    for line in text.splitlines():
+        match = re.match(r"^\s*(?:\d+[.)]|[-*+•])\s+(.+?)\s*$", line)
+        if match:
+            questions.append(match.group(1).strip("*_ "))
+    return questions[:limit]
+
+def create_research_planner(llm: ChatGoogleGenerativeAI, fanout: int,
+                            response_cache: Optional[ResponseCache] = None,
+                            scheduler: Optional[CallScheduler] = None,
+                            fallback_llm: Optional[BaseChatModel] = None) -> Runnable:
+    """Creates a planner that splits the topic into sub-questions for parallel research"""
+
+    planner_prompt = ChatPromptTemplate.from_messages([
+        ("system", """You are a Research Specialist AI planning an investigation.
+        Break the research topic into {fanout} distinct, specific sub-questions that together
+        cover the topic. Avoid overlap between them.
+
+        Respond with a numbered list of questions only, one per line.
+        """),
+        ("human", "Research Topic: {research_topic}")
+    ])
+
+    planner_chain = cached_chain("research_planner", planner_prompt, llm, response_cache, scheduler)
+    planner_fallback = (cached_chain("research_planner", planner_prompt, fallback_llm, response_cache, scheduler)
+                        if fallback_llm else None)
+
+    def build_inputs(state: AgentState) -> dict:
+        return {"fanout": fanout, "research_topic": state["research_topic"]}
+
+    def on_response(state: AgentState, inputs: dict, response) -> AgentState:
+        """Plan sub-questions for the research branches"""
+        return {
+            "current_agent": "researcher",
+            # Fall back to researching the topic as a single branch
+            "sub_questions": _parse_sub_questions(response.content, fanout) or [state["research_topic"]],
+            "prompt_tokens": {"researcher": prompt_tokens(response, planner_prompt.format_messages(**inputs))}
+        }
+
+    def on_error(state: AgentState, e: Exception) -> AgentState:
+        # The topic is still researched as a single branch
+        return {
+            "current_agent": "researcher",
+            "sub_questions": [state["research_topic"]],
+            "failed_stages": ["researcher"]
+        }
+
+    return chain_node("researcher", planner_chain, build_inputs, on_response, on_error, planner_fallback)
+
+def dispatch_sub_questions(state: AgentState) -> List[Send]:
+    """Start one research branch per planned sub-question."""
+    return [
+        Send("research_branch", {
+            "research_topic": state["research_topic"],
+            "sub_question": question,
+            "index": index
+        })
+        for index, question in enumerate(state["sub_questions"])
+    ]
+
+def create_sub_question_agent(llm: ChatGoogleGenerativeAI,
+                              response_cache: Optional[ResponseCache] = None,
+                              scheduler: Optional[CallScheduler] = None,
+                              fallback_llm: Optional[BaseChatModel] = None) -> Runnable:
+    """Creates a research agent that investigates a single sub-question"""
+
+    branch_prompt = ChatPromptTemplate.from_messages([
+        ("system", """You are a Research Specialist AI. Your role is to:
+        1. Investigate one specific question within a broader research topic
+        2. Provide research findings and insights for that question
+        3. Note any angles that deserve deeper analysis
+
+        Stay focused on the question; other specialists cover the rest of the topic.
+        Always structure your response with clear sections and bullet points.
+        """),
+        ("human", "Research Topic: {research_topic}\nQuestion: {sub_question}")
+    ])
+
+    branch_chain = cached_chain("research_branch", branch_prompt, llm, response_cache, scheduler)
+    branch_fallback = (cached_chain("research_branch", branch_prompt, fallback_llm, response_cache, scheduler)
+                       if fallback_llm else None)
+
+    def build_inputs(task: SubQuestionTask) -> dict:
+        return {"research_topic": task["research_topic"], "sub_question": task["sub_question"]}
+
+    def partial(task: SubQuestionTask, content: str) -> dict:
+        return {"index": task["index"], "question": task["sub_question"], "content": content}
+
+    def on_response(task: SubQuestionTask, inputs: dict, response) -> AgentState:
+        """Record the findings for one sub-question"""
+        return {
+            "research_partials": [partial(task, response.content)],
+            "prompt_tokens": {"researcher": prompt_tokens(response, branch_prompt.format_messages(**inputs))}
+        }
+
+    def on_error(task: SubQuestionTask, e: Exception) -> AgentState:
+        return {
+            "research_partials": [partial(task, f"Research agent error: {str(e)}")],
+            "failed_stages": ["researcher"]
+        }
+
+    return chain_node("research_branch", branch_chain, build_inputs, on_response, on_error, branch_fallback)
+
+def merge_research(state: AgentState) -> AgentState:
+    """Merge the parallel research branches into findings["research"]"""
+    planned = state["sub_questions"]
+    # Keep only branches of the current plan, in plan order
+    partials = sorted(
+        (p for p in state.get("research_partials", []) if p["index"] < len(planned)
+         and p["question"] == planned[p["index"]]),
+        key=lambda p: p["index"]
+    )
+    overview = "\n\n".join(f"## {p['question']}\n\n{p['content']}" for p in partials)
+
+    findings = {
+        "research_overview": overview,
+        "key_areas": [p["question"] for p in partials],
+        "initial_insights": overview[:500] + "..."
+    }
+
+    return {
+        "messages": [AIMessage(content=overview)],
+        "next": "analyst",
+        "current_agent": "researcher",
+        "research_topic": state["research_topic"],
+        "findings": {**state.get("findings", {}), "research": findings},
+        "final_report": state.get("final_report", "")
+    }
+
+ROUTING_MODES = ("rules", "llm")
+
+def next_in_sequence(current_agent: str) -> str:
+    """Fixed researcher -> analyst -> writer -> FINISH workflow order."""
+    if current_agent == "researcher":
+        return "analyst"
+    elif current_agent == "analyst":
+        return "writer"
+    elif current_agent == "writer":
+        return "FINISH"
+    return "researcher"
+
+def create_supervisor_agent(llm: ChatGoogleGenerativeAI, members: List[str], routing: str = "rules",
+                            context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGETS["supervisor"],
+                            response_cache: Optional[ResponseCache] = None,
+                            scheduler: Optional[CallScheduler] = None,
+                            fallback_llm: Optional[BaseChatModel] = None) -> Runnable:
+    """Creates a supervisor agent to coordinate the team
 
-def create_supervisor_agent(llm: ChatGoogleGenerativeAI, members: List[str]) -> callable:
-    """Creates a supervisor agent to coordinate the team"""
+    With routing="rules" the fixed workflow order is applied locally without an
+    LLM call. routing="llm" asks the model for the next step, for non-linear workflows.
+    """
+    if routing not in ROUTING_MODES:
+        raise ValueError(f"Unknown routing mode: {routing}. Expected one of {ROUTING_MODES}")
    
     options = ["FINISH"] + members
    
@@ -221,80 +548,165 @@ def create_supervisor_agent(llm: ChatGoogleGenerativeAI, members: List[str]) ->
         ("human", "Current status: {current_agent} just completed their task for topic: {research_topic}")
     ])
    
-    supervisor_chain = supervisor_prompt | llm
+    supervisor_chain = cached_chain("supervisor", supervisor_prompt, llm, response_cache, scheduler)
+    supervisor_fallback = (cached_chain("supervisor", supervisor_prompt, fallback_llm, response_cache, scheduler)
+                           if fallback_llm else None)
+
+    def build_inputs(state: AgentState) -> dict:
+        return {
+            "messages": compact_messages(state["messages"], context_budget),
+            "current_agent": state.get("current_agent", "none"),
+            "research_topic": state["research_topic"]
+        }
+
+    def parse_route(state: AgentState, response) -> str:
+        """Map the model's reply to a node, falling back to the fixed order"""
+        next_agent = response.content.strip().lower()
+       
+        if "finish" in next_agent or "complete" in next_agent:
+            return "FINISH"
+        elif "research" in next_agent:
+            return "researcher"
+        elif "analy" in next_agent:
+            return "analyst"
+        elif "writ" in next_agent:
+            return "writer"
+        return next_in_sequence(state.get("current_agent", ""))
+
+    def decision(state: AgentState, next_step: str, tokens: int = 0) -> AgentState:
+        return {
+            "messages": [AIMessage(content=f"Supervisor decision: Next agent is {next_step}")],
+            "next": next_step,
+            "current_agent": "supervisor",
+            "research_topic": state["research_topic"],
+            "findings": state.get("findings", {}),
+            "final_report": state.get("final_report", ""),
+            "prompt_tokens": {"supervisor": tokens}
+        }
+
+    def on_error(state: AgentState, e: Exception) -> AgentState:
+        error_msg = f"Supervisor error: {str(e)}"
+        return {
+            "messages": [AIMessage(content=error_msg)],
+            "next": "FINISH",
+            "current_agent": "supervisor",
+            "research_topic": state["research_topic"],
+            "findings": state.get("findings", {}),
+            "final_report": state.get("final_report", ""),
+            "failed_stages": ["supervisor"]
+        }
+
+    def pick(state: AgentState, config) -> Runnable:
+        # Paced as the stage it is about to route to
+        behind = behind_budget(next_in_sequence(state.get("current_agent", "")), config)
+        return supervisor_fallback if supervisor_fallback is not None and behind else supervisor_chain
    
-    def supervisor_agent(state: AgentState) -> AgentState:
+    def supervisor_agent(state: AgentState, config) -> AgentState:
         """Execute supervisor coordination"""
+        started_at, start = time.time(), time.perf_counter()
+        if routing != "llm":
+            update = decision(state, next_in_sequence(state.get("current_agent", "")))
+            return {**update, "spans": [make_span("supervisor", state, config, started_at, start)]}
+        inputs = build_inputs(state)
         try:
-            response = supervisor_chain.invoke({
-                "messages": state["messages"],
-                "current_agent": state.get("current_agent", "none"),
-                "research_topic": state["research_topic"]
-            })
-           
-            next_agent = response.content.strip().lower()
-           
-            if "finish" in next_agent or "complete" in next_agent:
-                next_step = "FINISH"
-            elif "research" in next_agent:
-                next_step = "researcher"
-            elif "analy" in next_agent:
-                next_step = "analyst"
-            elif "writ" in next_agent:
-                next_step = "writer"
-            else:
-                current = state.get("current_agent", "")
-                if current == "researcher":
-                    next_step = "analyst"
-                elif current == "analyst":
-                    next_step = "writer"
-                elif current == "writer":
-                    next_step = "FINISH"
-                else:
-                    next_step = "researcher"
-           
-            return {
-                "messages": state["messages"] + [AIMessage(content=f"Supervisor decision: Next agent is {next_step}")],
-                "next": next_step,
-                "current_agent": "supervisor",
-                "research_topic": state["research_topic"],
-                "findings": state.get("findings", {}),
-                "final_report": state.get("final_report", "")
-            }
-           
+            response = pick(state, config).invoke(inputs)
         except Exception as e:
-            error_msg = f"Supervisor error: {str(e)}"
-            return {
-                "messages": state["messages"] + [AIMessage(content=error_msg)],
-                "next": "FINISH",
-                "current_agent": "supervisor",
-                "research_topic": state["research_topic"],
-                "findings": state.get("findings", {}),
-                "final_report": state.get("final_report", "")
-            }
+            return {**on_error(state, e), "spans": [make_span("supervisor", state, config, started_at, start, error=e)]}
+        update = decision(state, parse_route(state, response), prompt_tokens(response, inputs["messages"]))
+        return {**update, "spans": [make_span("supervisor", state, config, started_at, start, response)]}
+
+    async def asupervisor_agent(state: AgentState, config) -> AgentState:
+        """Execute supervisor coordination without blocking the event loop"""
+        started_at, start = time.time(), time.perf_counter()
+        if routing != "llm":
+            update = decision(state, next_in_sequence(state.get("current_agent", "")))
+            return {**update, "spans": [make_span("supervisor", state, config, started_at, start)]}
+        inputs = build_inputs(state)
+        try:
+            response = await pick(state, config).ainvoke(inputs)
+        except Exception as e:
+            return {**on_error(state, e), "spans": [make_span("supervisor", state, config, started_at, start, error=e)]}
+        update = decision(state, parse_route(state, response), prompt_tokens(response, inputs["messages"]))
+        return {**update, "spans": [make_span("supervisor", state, config, started_at, start, response)]}
    
-    return supervisor_agent
+    return RunnableLambda(supervisor_agent, afunc=asupervisor_agent, name="supervisor")
 
 
-def create_research_team_graph() -> StateGraph:
-    """Creates the complete research team workflow graph"""
-   
-    llm = create_llm()
+def create_research_team_graph(routing: str = "rules", api_key: Optional[str] = None,
+                               model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+                               context_budgets: Optional[dict] = None, research_fanout: int = 0,
+                               llm: Optional[BaseChatModel] = None,
+                               response_cache: Optional[ResponseCache] = None,
+                               scheduler: Optional[CallScheduler] = None,
+                               stage_models: Optional[Dict[str, StageModel]] = None) -> StateGraph:
+    """Creates the complete research team workflow graph
+
+    context_budgets overrides the per-agent history budgets (tokens) from
+    DEFAULT_CONTEXT_BUDGETS; a budget of None sends the full history.
+    With research_fanout > 1 the research stage plans that many sub-questions
+    and researches them as parallel branches before the analyst runs.
+    llm replaces the Gemini client, e.g. with fakes.FakeChatModel for offline runs.
+    response_cache memoizes every stage's replies, so a stage whose prompt is
+    unchanged is served from disk instead of calling the model.
+    scheduler rate limits and retries every model call, at the priority set in
+    the run's config.
+    stage_models overrides the model, temperature and latency-budget fallback
+    of single agents (see stage_models.StageModel); the rest use model and
+    temperature. A custom llm stands in for model and temperature, and other
+    stage settings are applied to copies of it.
+    """
+    settings = resolve_stage_models(stage_models, model, temperature)
+    clients = {}
+
+    def client(name: Optional[str], temp: float) -> Optional[BaseChatModel]:
+        if name is None:
+            return None
+        # Stages with the same settings share one client
+        if (name, temp) not in clients:
+            clients[name, temp] = stage_llm(name, temp, api_key=api_key, llm=llm, base=(model, temperature))
+        return clients[name, temp]
+
+    def stage_llms(stage: str) -> Tuple[BaseChatModel, Optional[BaseChatModel]]:
+        """A stage's model and its fallback, None when there is nothing to downgrade to."""
+        stage_settings = settings[stage]
+        primary = client(stage_settings["model"], stage_settings["temperature"])
+        fallback = client(stage_settings["fallback"], stage_settings["temperature"])
+        return primary, fallback if fallback is not primary else None
+
+    budgets = {**DEFAULT_CONTEXT_BUDGETS, **(context_budgets or {})}
+    shared = {"response_cache": response_cache, "scheduler": scheduler}
    
     members = ["researcher", "analyst", "writer"]
-    researcher = create_research_agent(llm)
-    analyst = create_analyst_agent(llm)
-    writer = create_writer_agent(llm)
-    supervisor = create_supervisor_agent(llm, members)
+    research_llm, research_fallback = stage_llms("researcher")
+    analyst_llm, analyst_fallback = stage_llms("analyst")
+    writer_llm, writer_fallback = stage_llms("writer")
+    supervisor_llm, supervisor_fallback = stage_llms("supervisor")
+    researcher = create_research_agent(research_llm, context_budget=budgets["researcher"],
+                                       fallback_llm=research_fallback, **shared)
+    analyst = create_analyst_agent(analyst_llm, context_budget=budgets["analyst"], fallback_llm=analyst_fallback,
+                                   **shared)
+    writer = create_writer_agent(writer_llm, context_budget=budgets["writer"], fallback_llm=writer_fallback, **shared)
+    supervisor = create_supervisor_agent(supervisor_llm, members, routing=routing, context_budget=budgets["supervisor"],
+                                         fallback_llm=supervisor_fallback, **shared)
    
     workflow = StateGraph(AgentState)
    
-    workflow.add_node("researcher", researcher)
     workflow.add_node("analyst", analyst)
     workflow.add_node("writer", writer)
     workflow.add_node("supervisor", supervisor)
    
-    workflow.add_edge("researcher", "supervisor")
+    if research_fanout > 1:
+        workflow.add_node("researcher", create_research_planner(research_llm, research_fanout,
+                                                                fallback_llm=research_fallback, **shared))
+        workflow.add_node("research_branch", create_sub_question_agent(research_llm, fallback_llm=research_fallback,
+                                                                       **shared))
+        workflow.add_node("research_merge", merge_research)
+        workflow.add_conditional_edges("researcher", dispatch_sub_questions, ["research_branch"])
+        workflow.add_edge("research_branch", "research_merge")
+        workflow.add_edge("research_merge", "supervisor")
+    else:
+        workflow.add_node("researcher", researcher)
+        workflow.add_edge("researcher", "supervisor")
     workflow.add_edge("analyst", "supervisor")
     workflow.add_edge("writer", "supervisor")
    
@@ -314,50 +726,450 @@ def create_research_team_graph() -> StateGraph:
     return workflow
 
 
-def compile_research_team():
-    """Compile the research team graph with memory"""
-    workflow = create_research_team_graph()
+def compile_research_team(routing: str = "rules", api_key: Optional[str] = None,
+                          model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+                          context_budgets: Optional[dict] = None, research_fanout: int = 0,
+                          llm: Optional[BaseChatModel] = None, checkpointer=None,
+                          response_cache: Optional[ResponseCache] = None,
+                          scheduler: Optional[CallScheduler] = None,
+                          stage_models: Optional[Dict[str, StageModel]] = None):
+    """Compile the research team graph with memory
+
+    checkpointer defaults to an in-memory saver; pass CheckpointStore.saver for
+    durable, resumable runs.
+    """
+    workflow = create_research_team_graph(routing=routing, api_key=api_key, model=model, temperature=temperature,
+                                          context_budgets=context_budgets, research_fanout=research_fanout,
+                                          llm=llm, response_cache=response_cache, scheduler=scheduler,
+                                          stage_models=stage_models)
    
-    memory = MemorySaver()
+    memory = checkpointer or MemorySaver()
    
     app = workflow.compile(checkpointer=memory)
    
     return app
 
 
-def run_research_team(topic: str, callback=None, thread_id: str = "research_session_1"):
-    """Run the complete research team workflow"""
-    
-    app = compile_research_team()
-    
-    initial_state = {
+def get_research_team(routing: str = "rules", api_key: Optional[str] = None,
+                      model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+                      context_budgets: Optional[dict] = None, research_fanout: int = 0,
+                      llm: Optional[BaseChatModel] = None, checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH,
+                      response_cache_path: Optional[str] = None, stage_models: Optional[Dict[str, StageModel]] = None):
+    """Return a shared compiled research team, compiling it on first use.
+
+    Runs are checkpointed to the SQLite file at checkpoint_path, or in memory when it is None.
+    Stage replies are memoized in the SQLite file at response_cache_path, if given.
+    Model calls go through the process-wide scheduler.get_scheduler().
+    """
+    # A custom llm and the scheduler are keyed by identity; the cached app keeps them alive, so the ids stay unique
+    client = _key_digest(api_key) if llm is None else ("llm", id(llm))
+    scheduler = get_scheduler()
+    return app_registry.get_or_create(
+        (routing, model, temperature, client, tuple(sorted((context_budgets or {}).items())), research_fanout,
+         checkpoint_path, response_cache_path, stage_models_key(stage_models), id(scheduler)),
+        lambda: compile_research_team(
+            routing=routing, api_key=api_key, model=model, temperature=temperature,
+            context_budgets=context_budgets, research_fanout=research_fanout, llm=llm, stage_models=stage_models,
+            checkpointer=get_checkpoint_store(checkpoint_path).saver if checkpoint_path else None,
+            response_cache=get_response_cache(response_cache_path) if response_cache_path else None,
+            scheduler=scheduler
+        )
+    )
+
+
+def _initial_state(topic: str) -> AgentState:
+    return {
         "messages": [HumanMessage(content=f"Research the topic: {topic}")],
         "research_topic": topic,
         "next": "researcher",
         "current_agent": "start",
         "findings": {},
-        "final_report": ""
+        "final_report": "",
+        "prompt_tokens": {},
+        "sub_questions": [],
+        "research_partials": [],
+        "failed_stages": [],
+        "spans": []
+    }
+
+
+def _resume_point(app, config: dict, topic: str):
+    """Input and config that continue a thread from its last completed node.
+
+    Returns (None, None) when the thread already finished without errors.
+    """
+    snapshot = app.get_state(config)
+
+    def fork(past):
+        # Keep the run's own options, e.g. its priority, on the past checkpoint's config
+        return {**past.config, "configurable": {**past.config["configurable"], **config["configurable"]},
+                "max_concurrency": config.get("max_concurrency")}
+
+    if not snapshot.values:
+        return _initial_state(topic), config
+    if snapshot.next:
+        # Interrupted mid-run: pick up after the last checkpointed node
+        return None, config
+    failed = snapshot.values.get("failed_stages") or []
+    if not failed:
+        if snapshot.values.get("next") == "FINISH":
+            return None, None
+        # Stopped between a node's update and the next step, e.g. by closing the event
+        # stream: replay the last step from the checkpoint before it
+        for past in app.get_state_history(config):
+            if past.next:
+                return None, fork(past)
+        return None, None
+    # Fork from the checkpoint just before the first failed stage ran
+    for past in app.get_state_history(config):
+        if failed[0] in past.next:
+            return None, fork(past)
+    return None, None
+
+
+def _writer_token(chunk) -> Optional[str]:
+    """Text of a streamed writer token from a "messages" stream chunk, if any."""
+    # Only model chunks; the writer's completed message is echoed here too
+    token, metadata = chunk
+    if (metadata.get("langgraph_node") == "writer" and isinstance(token, AIMessageChunk)
+            and isinstance(token.content, str) and token.content):
+        return token.content
+    return None
+
+
+class _RunEvents:
+    """Turns one run's "tasks" and "messages" stream chunks into research events."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started = {}
+        # Finished nodes, for the step limit
+        self.steps = 0
+
+    def translate(self, mode: str, chunk) -> List[ResearchEvent]:
+        if mode == "messages":
+            token = _writer_token(chunk)
+            return [token_delta(self.run_id, "writer", token)] if token else []
+        if "input" in chunk:
+            self.started[chunk["id"]] = time.perf_counter()
+            return [stage_started(self.run_id, chunk["name"], chunk["id"])]
+        self.steps += 1
+        node, update = chunk["name"], chunk.get("result") or {}
+        duration = time.perf_counter() - self.started.pop(chunk["id"], time.perf_counter())
+        spans = update.get("spans") if isinstance(update, dict) else None
+        error = f"{type(chunk['error']).__name__}: {chunk['error']}" if chunk.get("error") else None
+        finished = stage_finished(self.run_id, node, chunk["id"], duration, spans[-1] if spans else None, error)
+        if not finished["error"]:
+            return [finished]
+        return [finished, run_error(self.run_id, finished["error"], node=node, fatal=False)]
+
+
+def stream_research_team(topic: str, thread_id: Optional[str] = None, routing: str = "rules",
+                         api_key: Optional[str] = None, context_budgets: Optional[dict] = None,
+                         research_fanout: int = 0, max_concurrency: int = 4, llm: Optional[BaseChatModel] = None,
+                         checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, resume: bool = False,
+                         response_cache_path: Optional[str] = None, response_max_age: Optional[int] = None,
+                         tokens: bool = True,
+                         priority: str = "interactive", stage_models: Optional[Dict[str, StageModel]] = None,
+                         latency_budget: Optional[float] = None) -> Iterator[ResearchEvent]:
+    """Run the research team workflow, yielding events.ResearchEvent as it goes
+
+    Yields run_started, then stage_started / stage_finished for every node,
+    token events with the writer's text (unless tokens=False) and error events
+    for failed nodes, and finally one result event. A run that stops with an
+    exception ends with a fatal error event instead of a result. Events hold
+    only scalars and references into the run's state, never copies of the
+    message history.
+
+    Options are those of run_research_team. Closing the generator early stops
+    the run; it stays resumable from its checkpoints.
+    """
+    app = get_research_team(routing=routing, api_key=api_key, context_budgets=context_budgets,
+                            research_fanout=research_fanout, llm=llm, checkpoint_path=checkpoint_path,
+                            response_cache_path=response_cache_path, stage_models=stage_models)
+    store = get_checkpoint_store(checkpoint_path) if checkpoint_path else None
+    thread_id = thread_id or f"research_{uuid.uuid4().hex}"
+
+    config = {
+        "configurable": {"thread_id": thread_id, "priority": priority, "latency_budget": latency_budget,
+                         "run_started_at": time.time(),
+                         # A resumed run reuses every stage reply it already paid for
+                         "response_max_age": None if resume else response_max_age},
+        "max_concurrency": max_concurrency
+    }
+    # Supervisor loop plus one node per research branch
+    max_steps = 10 + max(research_fanout, 0)
+
+    run_input, run_config = _resume_point(app, config, topic) if resume else (_initial_state(topic), config)
+    if run_config is None:
+        yield run_result(thread_id, app.get_state(config).values)
+        return
+
+    if store:
+        store.start_run(thread_id, topic)
+    # Stays "interrupted" if the run is stopped from outside, e.g. by closing the generator
+    status = "interrupted"
+    events = _RunEvents(thread_id)
+    try:
+        yield run_started(thread_id, topic, resume)
+        stream_mode = ["tasks", "messages"] if tokens else ["tasks"]
+        for mode, chunk in app.stream(run_input, config=run_config, stream_mode=stream_mode):
+            yield from events.translate(mode, chunk)
+            if events.steps > max_steps:
+                print("Maximum steps reached. Stopping execution.")
+                break
+
+        # Node updates only carry their own messages and counters
+        result = run_result(thread_id, app.get_state(config).values)
+        status = result["status"]
+        yield result
+
+    except Exception as e:
+        print(f"Error during execution: {str(e)}")
+        status = "failed"
+        yield run_error(thread_id, f"{type(e).__name__}: {e}")
+
+    finally:
+        if store:
+            store.finish_run(thread_id, status)
+        else:
+            # The shared in-memory checkpointer would otherwise grow with every run
+            app.checkpointer.delete_thread(thread_id)
+
+
+async def astream_research_team(topic: str, thread_id: Optional[str] = None, routing: str = "rules",
+                                api_key: Optional[str] = None, context_budgets: Optional[dict] = None,
+                                research_fanout: int = 0, max_concurrency: int = 4,
+                                cancel_event: Optional[asyncio.Event] = None, llm: Optional[BaseChatModel] = None,
+                                checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, resume: bool = False,
+                                response_cache_path: Optional[str] = None, response_max_age: Optional[int] = None,
+                                tokens: bool = True,
+                                priority: str = "interactive", stage_models: Optional[Dict[str, StageModel]] = None,
+                                latency_budget: Optional[float] = None) -> AsyncIterator[ResearchEvent]:
+    """Async iterator over the events of a run, on the running event loop
+
+    Same events as stream_research_team, with every agent calling Gemini
+    through ainvoke. Setting cancel_event stops the run after the current
+    event without a result; cancelling the consuming task stops it
+    immediately. Either way the run can be resumed.
+    """
+    app = get_research_team(routing=routing, api_key=api_key, context_budgets=context_budgets,
+                            research_fanout=research_fanout, llm=llm, checkpoint_path=checkpoint_path,
+                            response_cache_path=response_cache_path, stage_models=stage_models)
+    store = get_checkpoint_store(checkpoint_path) if checkpoint_path else None
+    thread_id = thread_id or f"research_{uuid.uuid4().hex}"
+
+    config = {
+        "configurable": {"thread_id": thread_id, "priority": priority, "latency_budget": latency_budget,
+                         "run_started_at": time.time(),
+                         # A resumed run reuses every stage reply it already paid for
+                         "response_max_age": None if resume else response_max_age},
+        "max_concurrency": max_concurrency
     }
-    
-    config = {"configurable": {"thread_id": thread_id}}
-    
+    max_steps = 10 + max(research_fanout, 0)
+
+    if resume:
+        run_input, run_config = await asyncio.to_thread(_resume_point, app, config, topic)
+    else:
+        run_input, run_config = _initial_state(topic), config
+    if run_config is None:
+        yield run_result(thread_id, (await app.aget_state(config)).values)
+        return
+
+    if store:
+        await asyncio.to_thread(store.start_run, thread_id, topic)
+    status = "interrupted"
+    events = _RunEvents(thread_id)
     try:
-        final_state = None
-        for step, state in enumerate(app.stream(initial_state, config=config)):
-            current_state = list(state.values())[0]
-            
-            # Call the callback function if provided
-            if callback:
-                callback(current_state)
-            
-            final_state = current_state
-            
-            if step > 10:
+        yield run_started(thread_id, topic, resume)
+        stream_mode = ["tasks", "messages"] if tokens else ["tasks"]
+        async for mode, chunk in app.astream(run_input, config=run_config, stream_mode=stream_mode):
+            if cancel_event is not None and cancel_event.is_set():
+                print("Research run cancelled.")
+                return
+            for event in events.translate(mode, chunk):
+                yield event
+            if events.steps > max_steps:
                 print("Maximum steps reached. Stopping execution.")
                 break
-        
-        return final_state
-        
+
+        result = run_result(thread_id, (await app.aget_state(config)).values)
+        status = result["status"]
+        yield result
+
     except Exception as e:
         print(f"Error during execution: {str(e)}")
-        return None
\ No newline at end of file
+        status = "failed"
+        yield run_error(thread_id, f"{type(e).__name__}: {e}")
+
+    finally:
+        # Blocking on purpose: this also runs while the task is being cancelled
+        if store:
+            store.finish_run(thread_id, status)
+        else:
+            app.checkpointer.delete_thread(thread_id)
+
+
+def run_research_team(topic: str, on_event: Optional[Callable[[ResearchEvent], None]] = None,
+                      thread_id: Optional[str] = None, routing: str = "rules", api_key: Optional[str] = None,
+                      context_budgets: Optional[dict] = None, on_token: Optional[Callable[[str], None]] = None,
+                      research_fanout: int = 0, max_concurrency: int = 4, llm: Optional[BaseChatModel] = None,
+                      checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, resume: bool = False,
+                      response_cache_path: Optional[str] = None, response_max_age: Optional[int] = None,
+                      priority: str = "interactive",
+                      stage_models: Optional[Dict[str, StageModel]] = None,
+                      latency_budget: Optional[float] = None) -> Optional[RunResult]:
+    """Run the complete research team workflow
+
+    The compiled app is shared across runs, so each run gets its own thread_id
+    unless one is given. Returns the run's result event: final_report,
+    findings, failed_stages, the prompt tokens each stage sent and the
+    telemetry spans. Returns None if the run stopped with an error.
+
+    on_event, if given, receives every event of stream_research_team. on_token
+    receives the writer's report text token by token as Gemini generates it;
+    without it no token events are produced.
+    research_fanout > 1 researches that many sub-questions in parallel, at
+    most max_concurrency at a time. llm overrides the Gemini client, e.g.
+    with fakes.FakeChatModel.
+
+    Progress is checkpointed to checkpoint_path (in memory when None). With
+    resume=True an interrupted or failed run on thread_id continues from its last
+    completed node, so only the missing or failed stages call Gemini again.
+    With response_cache_path set, each stage's reply is memoized there by model,
+    temperature and rendered prompt, and reused while the prompt is unchanged.
+    response_max_age (seconds) only reuses replies stored that recently, e.g.
+    the report cache TTL that sent the topic back to the agents; 0 reuses
+    none. Resumed runs ignore it.
+    priority ("interactive" or "batch") orders the run's model calls in the
+    shared rate limiter; batch calls wait while interactive ones are queued.
+
+    stage_models sets the model and temperature per agent, e.g.
+    {"writer": {"model": "gemini-2.5-pro"}}. With latency_budget (seconds),
+    agents that start after the run has used more than their share of the
+    budget call their fallback model instead (gemini-2.5-flash-lite unless
+    set in stage_models); see stage_models.LATENCY_BUDGET_SHARES.
+    """
+    result = None
+    for event in stream_research_team(topic, thread_id=thread_id, routing=routing, api_key=api_key,
+                                      context_budgets=context_budgets, research_fanout=research_fanout,
+                                      max_concurrency=max_concurrency, llm=llm, checkpoint_path=checkpoint_path,
+                                      resume=resume, response_cache_path=response_cache_path,
+                                      response_max_age=response_max_age, tokens=on_token is not None,
+                                      priority=priority, stage_models=stage_models, latency_budget=latency_budget):
+        if on_event:
+            on_event(event)
+        if on_token and event["type"] == "token":
+            on_token(event["text"])
+        elif event["type"] == "result":
+            result = event
+    return result
+
+
+async def run_research_team_async(topic: str, on_event: Optional[Callable] = None, thread_id: Optional[str] = None,
+                                  routing: str = "rules", api_key: Optional[str] = None,
+                                  context_budgets: Optional[dict] = None,
+                                  on_token: Optional[Callable[[str], None]] = None, research_fanout: int = 0,
+                                  max_concurrency: int = 4, cancel_event: Optional[asyncio.Event] = None,
+                                  llm: Optional[BaseChatModel] = None,
+                                  checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, resume: bool = False,
+                                  response_cache_path: Optional[str] = None, response_max_age: Optional[int] = None,
+                                  priority: str = "interactive",
+                                  stage_models: Optional[Dict[str, StageModel]] = None,
+                                  latency_budget: Optional[float] = None) -> Optional[RunResult]:
+    """Run the complete research team workflow on the running event loop
+
+    Same contract as run_research_team, over astream_research_team. on_event
+    and on_token may be plain functions or coroutines. Returns None when the
+    run is cancelled through cancel_event or stops with an error.
+    """
+    result = None
+    async for event in astream_research_team(topic, thread_id=thread_id, routing=routing, api_key=api_key,
+                                             context_budgets=context_budgets, research_fanout=research_fanout,
+                                             max_concurrency=max_concurrency, cancel_event=cancel_event, llm=llm,
+                                             checkpoint_path=checkpoint_path, resume=resume,
+                                             response_cache_path=response_cache_path,
+                                             response_max_age=response_max_age,
+                                             tokens=on_token is not None, priority=priority,
+                                             stage_models=stage_models, latency_budget=latency_budget):
+        callbacks = [on_event(event)] if on_event else []
+        if on_token and event["type"] == "token":
+            callbacks.append(on_token(event["text"]))
+        elif event["type"] == "result":
+            result = event
+        for pending in callbacks:
+            if inspect.isawaitable(pending):
+                await pending
+    return result
+
+
+def writer_instructions(audience: Optional[str] = None, length: Optional[str] = None) -> str:
+    """Extra guidance for a regenerated report, e.g. writer_instructions("executives", "about 300 words")."""
+    parts = []
+    if audience:
+        parts.append(f"Write this report for the following audience: {audience}.")
+    if length:
+        parts.append(f"Target length: {length}.")
+    return " ".join(parts)
+
+
+def _regeneration_state(topic: str, findings: dict, instructions: str) -> AgentState:
+    """Rebuild the state the writer sees after the analyst, from stored findings."""
+    messages = [HumanMessage(content=f"Research the topic: {topic}")]
+    research = findings.get("research", {}).get("research_overview")
+    analysis = findings.get("analysis", {}).get("analysis_summary")
+    messages += [AIMessage(content=text) for text in (research, analysis) if text]
+    if instructions:
+        messages.append(HumanMessage(content=instructions))
+    return {
+        **_initial_state(topic),
+        "messages": messages,
+        "next": "writer",
+        "current_agent": "analyst",
+        "findings": findings
+    }
+
+
+def regenerate_report(topic: str, findings: dict, audience: Optional[str] = None, length: Optional[str] = None,
+                      api_key: Optional[str] = None, llm: Optional[BaseChatModel] = None,
+                      on_token: Optional[Callable[[str], None]] = None,
+                      context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGETS["writer"],
+                      response_cache_path: Optional[str] = None,
+                      stage_models: Optional[Dict[str, StageModel]] = None) -> AgentState:
+    """Rewrite a report from stored research and analysis findings.
+
+    Only the writer node runs, so this is a single LLM call. audience and
+    length steer the rewrite; on_token streams it as in run_research_team.
+    The writer's model and temperature come from stage_models, as in a full run.
+    Returns the writer's state; failed_stages is ["writer"] if it errored.
+    """
+    client = _key_digest(api_key) if llm is None else ("llm", id(llm))
+    settings = resolve_stage_models(stage_models, DEFAULT_MODEL, DEFAULT_TEMPERATURE)["writer"]
+
+    def compile_writer():
+        writer_llm = stage_llm(settings["model"], settings["temperature"], api_key=api_key, llm=llm)
+        cache = get_response_cache(response_cache_path) if response_cache_path else None
+        workflow = StateGraph(AgentState)
+        workflow.add_node("writer", create_writer_agent(writer_llm, context_budget=context_budget,
+                                                        response_cache=cache, scheduler=get_scheduler()))
+        workflow.set_entry_point("writer")
+        workflow.add_edge("writer", END)
+        return workflow.compile()
+
+    app = app_registry.get_or_create(
+        ("writer_only", client, context_budget, response_cache_path, settings["model"], settings["temperature"]),
+        compile_writer
+    )
+    state = _regeneration_state(topic, findings, writer_instructions(audience, length))
+
+    final_state = state
+    stream_mode = ["values", "messages"] if on_token else ["values"]
+    config = {"configurable": {"thread_id": f"regenerate_{uuid.uuid4().hex}"}}
+    for mode, chunk in app.stream(state, config=config, stream_mode=stream_mode):
+        if mode == "messages":
+            token = _writer_token(chunk)
+            if token:
+                on_token(token)
+        else:
+            final_state = chunk
+    return final_state
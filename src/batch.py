@@ -0,0 +1,184 @@
+"""Headless batch runner: generate reports for a file of topics.
+
+    python batch.py topics.txt --concurrency 8 --ttl-hours 168
+
+Topics are read one per line (blank lines and lines starting with # are
+ignored). Topics with a fresh report in research_cache are skipped, new
+reports are written to SQLite in batched transactions and a JSON
+throughput/latency summary is printed at the end. Model calls run at
+batch priority, behind interactive runs in the same process, within the
+limits of scheduler.get_scheduler(). Stage replies are memoized in
+--llm-cache unless --force or --no-llm-cache is given. Use --fake to run
+against fakes.FakeChatModel without network access, and --events to log
+every stage start, finish and error to stderr as JSON lines.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+from agents import get_response_cache, run_research_team_async
+from checkpoints import checkpoint_path_for
+from database import Database, topic_fingerprint
+from events import event_json
+from llm_cache import DEFAULT_RESPONSE_CACHE_PATH
+from scheduler import get_scheduler
+from stage_models import parse_stage_models
+
+def read_topics(path: str) -> List[str]:
+    """Read topics from a text file, dropping blanks, comments and repeats."""
+    topics = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            topic = line.strip()
+            if not topic or topic.startswith("#"):
+                continue
+            fingerprint = topic_fingerprint(topic)
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                topics.append(topic)
+    return topics
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+def is_failed(state: Optional[Dict[str, Any]]) -> bool:
+    """No report, or one degraded by a failed stage; neither is cached."""
+    report = (state or {}).get("final_report", "")
+    return not report or report.startswith("Error generating report") or bool(state.get("failed_stages"))
+
+async def run_batch(topics: List[str], db: Database, concurrency: int = 4, max_age: Optional[int] = None,
+                    force: bool = False, flush_every: int = 25, **run_kwargs) -> Dict[str, Any]:
+    """Run the research team for each topic, at most concurrency at a time.
+
+    run_kwargs are passed to run_research_team_async (api_key, llm, routing, ...).
+    Returns a summary of counts, wall time, throughput and per-topic latency.
+    """
+    started = time.monotonic()
+    # Interactive runs in the same process go first
+    run_kwargs.setdefault("priority", "batch")
+    # Stage replies older than the report TTL would only rebuild the expired report
+    run_kwargs.setdefault("response_max_age", max_age)
+    cached = set() if force else db.get_cached_fingerprints(topics, max_age=max_age)
+    pending = [topic for topic in topics if topic_fingerprint(topic) not in cached]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    buffer = []
+    spans = []
+    latencies = []
+    failed = []
+    written = 0
+
+    def flush():
+        nonlocal written
+        if buffer:
+            written += db.cache_research_many(buffer)
+            buffer.clear()
+        if spans:
+            db.record_spans(spans)
+            spans.clear()
+
+    async def research(topic: str):
+        async with semaphore:
+            t0 = time.monotonic()
+            state = await run_research_team_async(topic, **run_kwargs)
+            latencies.append(time.monotonic() - t0)
+        spans.extend((state or {}).get("spans", []))
+        if is_failed(state):
+            failed.append(topic)
+            return
+        buffer.append((topic, state["final_report"], state.get("findings")))
+        if len(buffer) >= flush_every:
+            flush()
+
+    try:
+        await asyncio.gather(*(research(topic) for topic in pending))
+    finally:
+        flush()
+
+    elapsed = time.monotonic() - started
+    cache_path = run_kwargs.get("response_cache_path")
+    return {
+        "topics": len(topics),
+        "skipped_cached": len(topics) - len(pending),
+        "succeeded": len(pending) - len(failed),
+        "failed": len(failed),
+        "failed_topics": failed,
+        "written": written,
+        "concurrency": concurrency,
+        "wall_seconds": round(elapsed, 3),
+        "reports_per_minute": round(len(pending) / elapsed * 60, 2) if elapsed else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies) if latencies else None,
+        },
+        "llm_cache": get_response_cache(cache_path).stats() if cache_path else None,
+        "scheduler": get_scheduler().stats(),
+    }
+
+def log_event(event: dict):
+    # Results are summarized at the end
+    if event["type"] != "result":
+        print(event_json(event), file=sys.stderr)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate research reports for a file of topics.")
+    parser.add_argument("topics_file", help="text file with one topic per line")
+    parser.add_argument("--db", default="research_cache.db", help="SQLite cache path")
+    parser.add_argument("--concurrency", type=int, default=4, help="research runs in flight at once")
+    parser.add_argument("--ttl-hours", type=float, default=None,
+                        help="re-run topics whose cached report is older than this (default: never)")
+    parser.add_argument("--force", action="store_true", help="ignore cached reports")
+    parser.add_argument("--flush-every", type=int, default=25, help="reports per SQLite transaction")
+    parser.add_argument("--routing", choices=["rules", "llm"], default="rules")
+    parser.add_argument("--fanout", type=int, default=0, help="parallel research sub-questions per topic")
+    parser.add_argument("--llm-cache", default=DEFAULT_RESPONSE_CACHE_PATH, help="SQLite memo of stage replies")
+    parser.add_argument("--no-llm-cache", action="store_true", help="call the model for every stage")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake chat model")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--events", action="store_true", help="log run events to stderr as JSON lines")
+    parser.add_argument("--stage-models", type=parse_stage_models, default=None,
+                        help='per-agent models as JSON, e.g. \'{"writer": {"model": "gemini-2.5-pro"}}\'')
+    parser.add_argument("--latency-budget", type=float, default=None,
+                        help="seconds per run before later stages switch to their fallback model")
+    args = parser.parse_args(argv)
+
+    run_kwargs = {
+        "routing": args.routing,
+        "research_fanout": args.fanout,
+        "checkpoint_path": checkpoint_path_for(args.db),
+        "response_cache_path": None if args.force or args.no_llm_cache else args.llm_cache,
+        "stage_models": args.stage_models,
+        "latency_budget": args.latency_budget
+    }
+    if args.events:
+        run_kwargs["on_event"] = log_event
+    if args.fake:
+        from fakes import FakeChatModel
+        run_kwargs["llm"] = FakeChatModel(latency=args.fake_latency)
+    else:
+        run_kwargs["api_key"] = os.getenv("GOOGLE_API_KEY")
+
+    summary = asyncio.run(run_batch(
+        read_topics(args.topics_file),
+        Database(args.db),
+        concurrency=args.concurrency,
+        max_age=int(args.ttl_hours * 3600) if args.ttl_hours is not None else None,
+        force=args.force,
+        flush_every=args.flush_every,
+        **run_kwargs
+    ))
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Offline benchmarks: framework overhead, state growth, SQLite and plain-text export.
+
+    python benchmark.py --runs 20 --latency 0.01 --output bench.json
+    python benchmark.py --only database --db-rows 10000,100000,1000000
+
+Every LLM call goes to fakes.FakeChatModel, so nothing touches the network
+and results only depend on this code and the machine. The JSON written to
+stdout (or --output) is meant to be diffed between runs or commits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+from agents import _initial_state, get_research_team, run_research_team
+from database import Database, normalize_topic
+from fakes import FakeChatModel
+from message_store import message_tokens
+from scheduler import CallScheduler, set_scheduler
+from similarity import band_keys
+from utils import format_to_plaintext, iter_plaintext
+
+SUITES = ("pipeline", "state", "database", "plaintext")
+
+WORDS = """solar wind grid storage battery policy market cost demand supply carbon emission
+efficiency adoption regulation investment labour automation health vaccine climate model
+data analysis growth risk trend forecast region sector technology research evidence""".split()
+
+def summarize(samples: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """p50/p95/mean/max of samples, scaled (to milliseconds by default)."""
+    if not samples:
+        return {"n": 0, "p50": None, "p95": None, "mean": None, "max": None}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "n": len(samples),
+        "p50": round(statistics.median(ordered) * scale, 3),
+        "p95": round(p95 * scale, 3),
+        "mean": round(statistics.fmean(ordered) * scale, 3),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_pipeline(runs: int, latency: float, output_chars: int, fanout: int, routing: str) -> dict:
+    """End-to-end run_research_team time and the part of it not spent waiting on the model.
+
+    Per-node overhead is a span's duration minus the fake model latency;
+    graph overhead is the wall time outside all spans (scheduling,
+    checkpointing, reducers). overhead_ms is the two together.
+    """
+    llm = FakeChatModel(latency=latency, output_chars=output_chars)
+    # Warm-up compiles and caches the graph
+    run_research_team("warm-up topic", llm=llm, checkpoint_path=None, research_fanout=fanout, routing=routing)
+
+    walls, overheads, graph_overheads = [], [], []
+    node_overheads = defaultdict(list)
+    calls = 0
+    for i in range(runs):
+        start = time.perf_counter()
+        state = run_research_team(f"benchmark topic {i}", llm=llm, checkpoint_path=None,
+                                  research_fanout=fanout, routing=routing)
+        wall = time.perf_counter() - start
+        spans = state["spans"]
+        llm_spans = [span for span in spans if span["prompt_tokens"]]
+        calls += len(llm_spans)
+        node_time = {id(span): span["duration"] - (latency if span["prompt_tokens"] else 0.0) for span in spans}
+        graph_overhead = wall - sum(span["duration"] for span in spans)
+        walls.append(wall)
+        graph_overheads.append(graph_overhead)
+        # Parallel branches overlap in wall time, but their node overhead is still CPU spent
+        overheads.append(graph_overhead + sum(node_time.values()))
+        for span in spans:
+            node_overheads[span["node"]].append(node_time[id(span)])
+
+    return {
+        "runs": runs,
+        "fake_latency_s": latency,
+        "output_chars": output_chars,
+        "fanout": fanout,
+        "routing": routing,
+        "llm_calls_per_run": calls / runs if runs else 0,
+        "wall_ms": summarize(walls),
+        "overhead_ms": summarize(overheads),
+        "graph_overhead_ms": summarize(graph_overheads),
+        "node_overhead_ms": {node: summarize(samples) for node, samples in sorted(node_overheads.items())},
+    }
+
+def bench_state_growth(output_chars: int, fanout: int, routing: str) -> dict:
+    """Size of the message history after every graph step of one run."""
+    llm = FakeChatModel(output_chars=output_chars)
+    app = get_research_team(routing=routing, llm=llm, checkpoint_path=None, research_fanout=fanout)
+    config = {"configurable": {"thread_id": "benchmark-state-growth"}}
+    steps = []
+    for values in app.stream(_initial_state("state growth topic"), config=config, stream_mode="values"):
+        messages = values.get("messages", [])
+        steps.append({
+            "step": len(steps),
+            "agent": values.get("current_agent"),
+            "messages": len(messages),
+            "chars": sum(len(str(m.content)) for m in messages),
+            "est_tokens": message_tokens(messages),
+        })
+    app.checkpointer.delete_thread("benchmark-state-growth")
+    return {"output_chars": output_chars, "fanout": fanout, "steps": steps}
+
+def synthetic_report(rng: random.Random, chars: int) -> str:
+    """Markdown with headings, lists, emphasis and code, roughly chars long."""
+    parts = []
+    size = 0
+    section = 0
+    while size < chars:
+        section += 1
+        words = rng.choices(WORDS, k=60)
+        block = "\n".join([
+            f"## Section {section}: {' '.join(words[:3]).title()}",
+            "",
+            f"The **{words[3]}** outlook depends on *{words[4]}* and `{words[5]}` {' '.join(words[6:40])}.",
+            "",
+            f"- {' '.join(words[40:46])}",
+            f"- __{' '.join(words[46:50])}__ and _{words[50]}_",
+            f"1. {' '.join(words[51:60])}",
+            "",
+            "> " + " ".join(words[10:20]),
+            "",
+            "---",
+            "",
+        ])
+        parts.append(block)
+        size += len(block)
+    return "\n".join(parts)
+
+def similar_postings(path: str, topics: List[str]) -> Dict[str, Optional[float]]:
+    """LSH postings matching each topic's band keys, before find_similar_research caps them.
+
+    Should stay a small fraction of the row count as it grows; growing in
+    step with it means the band layout makes too many topics candidates.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        counts = []
+        for topic in topics:
+            keys = band_keys(normalize_topic(topic))
+            (count,) = conn.execute(
+                f"SELECT COUNT(*) FROM topic_lsh WHERE band_key IN ({', '.join('?' * len(keys))})", keys
+            ).fetchone()
+            counts.append(count)
+    finally:
+        conn.close()
+    return summarize(counts, scale=1)
+
+def bench_database(row_counts: List[int], report_chars: int, batch_size: int, lookups: int, seed: int) -> list:
+    """Insert and read throughput of Database at each row count, on a fresh file."""
+    results = []
+    for rows in row_counts:
+        rng = random.Random(seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "bench.db"))
+            # A few hundred distinct bodies keep generation cheap; rows still differ by topic
+            bodies = [synthetic_report(rng, report_chars) for _ in range(200)]
+            topics = [f"{' '.join(rng.choices(WORDS, k=3))} {i}" for i in range(rows)]
+
+            start = time.perf_counter()
+            for offset in range(0, rows, batch_size):
+                db.cache_research_many(
+                    (topic, f"# {topic}\n\n{rng.choice(bodies)}")
+                    for topic in topics[offset:offset + batch_size]
+                )
+            insert_seconds = time.perf_counter() - start
+
+            max_id = rows
+            reads = {
+                "get_cached_research": timed(lambda: db.get_cached_research(rng.choice(topics)), lookups),
+                "get_report": timed(lambda: db.get_report(rng.randint(1, max_id)), lookups),
+                "list_research_page": timed(
+                    lambda: db.list_research(limit=10, before_id=rng.randint(1, max_id)), lookups),
+                "search_research": timed(lambda: db.search_research(" ".join(rng.choices(WORDS, k=2))),
+                                         max(1, lookups // 10)),
+                "find_similar_research": timed(lambda: db.find_similar_research(rng.choice(topics)),
+                                               max(1, lookups // 10)),
+            }
+            stats = db.storage_stats()
+            db.close()
+            postings = similar_postings(os.path.join(tmp, "bench.db"), rng.sample(topics, min(rows, 100)))
+            results.append({
+                "rows": rows,
+                "report_chars": report_chars,
+                "insert_rows_per_s": round(rows / insert_seconds, 1),
+                "insert_seconds": round(insert_seconds, 3),
+                "file_mb": round(sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+                                 / 1024 ** 2, 2),
+                "stored_mb": round(stats["stored_bytes"] / 1024 ** 2, 2),
+                "read_ms": {name: summarize(samples) for name, samples in reads.items()},
+                "similar_postings": postings,
+            })
+    return results
+
+def bench_plaintext(sizes: List[int], repeat: int, seed: int) -> list:
+    """format_to_plaintext throughput on reports of the given sizes (chars).
+
+    stream_ms is the same conversion fed through iter_plaintext in 20-char
+    chunks, the size of a streamed token or two.
+    """
+    results = []
+    rng = random.Random(seed)
+    for size in sizes:
+        report = synthetic_report(rng, size)
+        samples = timed(lambda: format_to_plaintext(report), repeat)
+        chunks = [report[i:i + 20] for i in range(0, len(report), 20)]
+        stream_samples = timed(lambda: "".join(iter_plaintext(chunks)), repeat)
+        best = min(samples)
+        results.append({
+            "chars": len(report),
+            "ms": summarize(samples),
+            "stream_ms": summarize(stream_samples),
+            "mb_per_s": round(len(report) / 1024 ** 2 / best, 2) if best else None,
+        })
+    return results
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def int_list(value: str) -> List[int]:
+    return [int(float(item)) for item in value.split(",") if item.strip()]
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run offline SearchPro benchmarks and print JSON results.")
+    parser.add_argument("--only", default=",".join(SUITES), help=f"comma-separated suites from {', '.join(SUITES)}")
+    parser.add_argument("--runs", type=int, default=20, help="pipeline runs")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake LLM call")
+    parser.add_argument("--output-chars", type=int, default=2000, help="approximate fake reply length")
+    parser.add_argument("--fanout", type=int, default=0, help="parallel research sub-questions")
+    parser.add_argument("--routing", choices=["rules", "llm"], default="rules")
+    parser.add_argument("--db-rows", type=int_list, default=[10_000],
+                        help="row counts for the database suite, e.g. 10000,100000,1000000")
+    parser.add_argument("--report-chars", type=int, default=4000, help="size of each stored report")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per insert transaction")
+    parser.add_argument("--lookups", type=int, default=1000, help="point reads per database measurement")
+    parser.add_argument("--plaintext-sizes", type=int_list, default=[10_000, 100_000, 1_000_000],
+                        help="report sizes (chars) for format_to_plaintext")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per plaintext size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    suites = [suite.strip() for suite in args.only.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    # The fake model has no quota, and rate-limit waits would show up as framework overhead
+    set_scheduler(CallScheduler(requests_per_minute=None, tokens_per_minute=None))
+    results = {"environment": environment(), "suites": {}}
+    for suite in suites:
+        print(f"running {suite}...", file=sys.stderr)
+        start = time.perf_counter()
+        if suite == "pipeline":
+            results["suites"][suite] = bench_pipeline(args.runs, args.latency, args.output_chars,
+                                                      args.fanout, args.routing)
+        elif suite == "state":
+            results["suites"][suite] = bench_state_growth(args.output_chars, args.fanout, args.routing)
+        elif suite == "database":
+            results["suites"][suite] = bench_database(args.db_rows, args.report_chars, args.batch_size,
+                                                      args.lookups, args.seed)
+        elif suite == "plaintext":
+            results["suites"][suite] = bench_plaintext(args.plaintext_sizes, args.repeat, args.seed)
+        print(f"  {suite} took {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Any, Optional, Sequence
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+CHECKPOINT_FILE = "research_checkpoints.db"
+# Checkpoints of unfinished runs are kept this long for resuming
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+# Finished runs prune stale checkpoints at most this often
+DEFAULT_PRUNE_INTERVAL = 3600.0
+
+def checkpoint_path_for(db_path: str) -> str:
+    """Absolute path of the checkpoint file kept next to the research database at db_path."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), CHECKPOINT_FILE)
+
+# Next to the default research database, resolved once so a later chdir does not move it
+DEFAULT_CHECKPOINT_PATH = checkpoint_path_for("research_cache.db")
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """SqliteSaver that also serves astream by running its blocking calls in a worker thread.
+
+    This lets one durable checkpointer back both run_research_team and
+    run_research_team_async without an aiosqlite connection per event loop.
+    """
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = ""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+class CheckpointStore:
+    """Durable LangGraph checkpoints plus a registry of research runs, in one SQLite file.
+
+    Each run has its own thread. Threads of completed runs are dropped straight
+    away; failed or interrupted runs keep theirs so they can resume from the last
+    completed node, until prune() removes them. prune() runs on start and then
+    as runs finish, at most once per prune_interval seconds.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_CHECKPOINT_PATH,
+                 retention_seconds: int = DEFAULT_RETENTION_SECONDS,
+                 prune_interval: float = DEFAULT_PRUNE_INTERVAL):
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self.saver = ThreadedSqliteSaver(sqlite3.connect(db_path, check_same_thread=False))
+        self.saver.setup()
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS research_runs (
+                thread_id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._execute("CREATE INDEX IF NOT EXISTS idx_runs_updated ON research_runs(updated_at)")
+        self.prune()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        # Share the saver's connection and lock
+        with self.saver.lock:
+            rows = self.saver.conn.execute(sql, params).fetchall()
+            self.saver.conn.commit()
+        return rows
+
+    def start_run(self, thread_id: str, topic: str):
+        self._execute(
+            """
+            INSERT INTO research_runs (thread_id, topic, status) VALUES (?, ?, 'running')
+            ON CONFLICT(thread_id) DO UPDATE SET status = 'running', updated_at = CURRENT_TIMESTAMP
+            """,
+            (thread_id, topic)
+        )
+
+    def finish_run(self, thread_id: str, status: str):
+        """Record a run's outcome: "done", "failed" or "interrupted"."""
+        self._execute(
+            "UPDATE research_runs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE thread_id = ?",
+            (status, thread_id)
+        )
+        if status == "done":
+            self.saver.delete_thread(thread_id)
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune()
+
+    def get_run(self, thread_id: str) -> Optional[dict]:
+        rows = self._execute(
+            "SELECT thread_id, topic, status, created_at, updated_at FROM research_runs WHERE thread_id = ?",
+            (thread_id,)
+        )
+        if not rows:
+            return None
+        thread_id, topic, status, created_at, updated_at = rows[0]
+        return {"thread_id": thread_id, "topic": topic, "status": status,
+                "created_at": created_at, "updated_at": updated_at}
+
+    def prune(self, max_age: Optional[int] = None) -> int:
+        """Delete runs and checkpoints not updated for max_age seconds. Returns the run count."""
+        max_age = self.retention_seconds if max_age is None else max_age
+        self._last_prune = time.monotonic()
+        stale = self._execute(
+            "SELECT thread_id FROM research_runs WHERE updated_at < datetime('now', ?)",
+            (f"-{max_age} seconds",)
+        )
+        for (thread_id,) in stale:
+            self.saver.delete_thread(thread_id)
+            self._execute("DELETE FROM research_runs WHERE thread_id = ?", (thread_id,))
+        return len(stale)
@@ -0,0 +1,107 @@
+import time
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from database import Database
+from scheduler import get_scheduler
+from telemetry import span_cost
+
+STAGE_ORDER = ["supervisor", "researcher", "research_branch", "analyst", "writer"]
+
+def load_metrics(db: Database, days: int) -> pd.DataFrame:
+    """Spans of the last days as a DataFrame, with per-span estimated cost."""
+    df = pd.DataFrame(db.get_run_metrics(since=time.time() - days * 86400))
+    if df.empty:
+        return df
+    df["started"] = pd.to_datetime(df["started_at"], unit="s")
+    # Spans without a model call have no model; pandas reads those as NaN
+    df["cost"] = [span_cost(model if isinstance(model, str) else None, prompt, completion)
+                  for model, prompt, completion in zip(df["model"], df["prompt_tokens"], df["completion_tokens"])]
+    return df
+
+def stage_latency(df: pd.DataFrame) -> pd.DataFrame:
+    """p50/p95 wall time per stage, in pipeline order."""
+    latency = df.groupby("node")["duration"].quantile([0.5, 0.95]).unstack()
+    latency.columns = ["p50", "p95"]
+    latency["calls"] = df.groupby("node").size()
+    latency["errors"] = df.groupby("node")["error"].count()
+    order = [node for node in STAGE_ORDER if node in latency.index] + \
+        [node for node in latency.index if node not in STAGE_ORDER]
+    return latency.loc[order]
+
+def run_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per run: start, topic, wall time from first span start to last span end, tokens and cost.
+
+    Parallel research branches overlap, so span durations are not summed.
+    """
+    runs = df.assign(ended_at=df["started_at"] + df["duration"]).groupby("run_id").agg(
+        started=("started", "min"),
+        topic=("topic", "first"),
+        started_at=("started_at", "min"),
+        ended_at=("ended_at", "max"),
+        prompt_tokens=("prompt_tokens", "sum"),
+        completion_tokens=("completion_tokens", "sum"),
+        cost=("cost", "sum"),
+        errors=("error", "count"),
+    )
+    runs["seconds"] = runs.pop("ended_at") - runs.pop("started_at")
+    return runs.sort_values("started")
+
+def show_performance_dashboard(db: Database):
+    st.title("📈 Performance")
+    days = st.selectbox("Period", [1, 7, 30, 90], index=1, format_func=lambda d: f"Last {d} days")
+    df = load_metrics(db, days)
+    if df.empty:
+        st.info("No research runs recorded in this period yet.")
+    else:
+        show_run_metrics(df)
+    show_rate_limiting()
+
+def show_run_metrics(df: pd.DataFrame):
+    runs = run_totals(df)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Runs", f"{len(runs):,}")
+    col2.metric("Median run time", f"{runs['seconds'].median():.1f} s")
+    col3.metric("Tokens per run", f"{(runs['prompt_tokens'] + runs['completion_tokens']).mean():,.0f}")
+    col4.metric("Est. cost", f"${runs['cost'].sum():.2f}")
+
+    st.subheader("Stage latency")
+    latency = stage_latency(df)
+    fig = px.bar(latency.reset_index().melt(id_vars="node", value_vars=["p50", "p95"],
+                                            var_name="percentile", value_name="seconds"),
+                 x="node", y="seconds", color="percentile", barmode="group")
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(latency.style.format({"p50": "{:.2f} s", "p95": "{:.2f} s"}), use_container_width=True)
+
+    st.subheader("Tokens per run")
+    recent = runs.tail(50).reset_index()
+    fig = px.bar(recent, x="started", y=["prompt_tokens", "completion_tokens"], hover_data=["topic"],
+                 labels={"value": "tokens", "variable": ""})
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Cost trend")
+    daily = runs.set_index("started")["cost"].resample("D").sum().reset_index()
+    fig = px.line(daily, x="started", y="cost", markers=True, labels={"started": "day", "cost": "USD (estimated)"})
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption("Costs are estimated from token counts at list prices; cached replies count as free.")
+
+def show_rate_limiting():
+    stats = get_scheduler().stats()
+    st.subheader("Gemini rate limiting")
+    priorities = stats["priorities"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Calls waiting", stats["waiting"])
+    col2.metric("Calls", f"{sum(p['calls'] for p in priorities.values()):,}")
+    col3.metric("Retries", f"{sum(p['retries'] for p in priorities.values()):,}")
+    col4.metric("Rate limited", f"{sum(p['rate_limited'] for p in priorities.values()):,}")
+    if priorities:
+        table = pd.DataFrame([
+            {"priority": name, "calls": p["calls"], "retries": p["retries"], "failures": p["failures"],
+             "queue p50 (ms)": p["queue_ms"]["p50"], "queue p95 (ms)": p["queue_ms"]["p95"]}
+            for name, p in priorities.items()
+        ]).set_index("priority")
+        st.dataframe(table, use_container_width=True)
+    limits = [f"{stats['requests_per_minute']:,.0f} requests" if stats["requests_per_minute"] else None,
+              f"{stats['tokens_per_minute']:,.0f} tokens" if stats["tokens_per_minute"] else None]
+    limits = " and ".join(limit for limit in limits if limit) or "no limit"
+    st.caption(f"Since this server started; limit {limits} per minute.")
@@ -1,44 +1,1032 @@
 import sqlite3
+import hashlib
+import json
+import queue
+import random
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Set
 import os
+from similarity import band_keys, jaccard, topic_shingles
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bump when adding a step to Database._migrate
+SCHEMA_VERSION = 13
+
+# Applied to every pooled connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    # Durable at checkpoints, and no fsync per commit under WAL
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+# research_jobs columns, in the order _job() reads them
+JOB_COLUMNS = ("id", "queue", "topic", "thread_id", "params", "status", "resume", "stages", "research_id",
+               "prompt_tokens", "error", "created_at", "started_at", "finished_at")
+
+def normalize_topic(topic: str) -> str:
+    """Fold case, punctuation and whitespace so equivalent topics compare equal."""
+    text = unicodedata.normalize("NFKC", topic).casefold()
+    text = re.sub(r"[^\w\s]|_", " ", text)
+    return " ".join(text.split())
+
+def topic_fingerprint(topic: str) -> str:
+    """Stable cache key for a research topic."""
+    return hashlib.sha1(normalize_topic(topic).encode("utf-8")).hexdigest()
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+# New report bodies use zstd when the zstandard package is installed, else zlib.
+# The codec is stored per blob, so files written with either stay readable.
+REPORT_CODEC = "zstd" if zstandard else "zlib"
+
+def compress_report(report: str, codec: str = REPORT_CODEC) -> bytes:
+    data = report.encode("utf-8")
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+def decompress_report(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This report is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    return data.decode("utf-8")
+
+def report_hash(report: str) -> str:
+    """Content address of a report body."""
+    return hashlib.sha256(report.encode("utf-8")).hexdigest()
+
+# The stage outputs regenerate_report rebuilds the writer's input from; nothing else in findings is stored
+STORED_FINDINGS = {"research": "research_overview", "analysis": "analysis_summary"}
+
+def stored_findings(findings: Optional[dict]) -> dict:
+    """The part of a run's findings that is kept with its report."""
+    findings = findings or {}
+    return {stage: {key: findings[stage][key]} for stage, key in STORED_FINDINGS.items()
+            if isinstance(findings.get(stage), dict) and findings[stage].get(key)}
+
+def _fts5_available() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
 
 class Database:
-    def __init__(self, db_path="research_cache.db"):
+    """SQLite-backed report cache.
+
+    Connections are pooled and reused across calls and threads. They run in WAL
+    mode so readers never block the writer. Writes take the lock up front with
+    BEGIN IMMEDIATE, and a transaction that still finds the database locked
+    after busy_timeout is retried with jittered backoff.
+
+    Retention is bounded by max_rows, max_bytes (compressed report and
+    findings bytes) and max_age (seconds since a report was created); any
+    left as None is unbounded. When one is set, a background thread evicts least recently
+    used reports in small batches every maintenance_interval seconds and
+    returns freed pages to the file system with incremental VACUUM.
+    """
+
+    def __init__(self, db_path="research_cache.db", cache_ttl: Optional[int] = None,
+                 pool_size: int = 8, busy_timeout: float = 5.0, max_retries: int = 5,
+                 max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_age: Optional[int] = None, maintenance_interval: float = 300.0):
         self.db_path = db_path
+        # Default maximum age (seconds) of a cached report; None never expires
+        self.cache_ttl = cache_ttl
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.maintenance_interval = maintenance_interval
+        self._stop_maintenance = threading.Event()
+        self._maintenance_thread = None
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        # Bumped on every write through this instance, see change_token()
+        self._generation = 0
+        # Without FTS5 in the local SQLite build, search falls back to topic LIKE
+        self.fts_enabled = _fts5_available()
         # Create database directory if it doesn't exist
         os.makedirs(os.path.dirname(os.path.abspath(db_path)) if os.path.dirname(db_path) else '.', exist_ok=True)
         self.init_db()
+        if any(limit is not None for limit in (max_rows, max_bytes, max_age)):
+            self.start_maintenance()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            # Transactions are managed explicitly in _write
+            isolation_level=None,
+            check_same_thread=False,
+            # Statement cache: repeated queries skip re-preparing
+            cached_statements=256
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        # Lets SQL (the full-text index in particular) read compressed report bodies
+        conn.create_function("decompress_report", 2, decompress_report, deterministic=True)
+        conn.create_function("topic_fingerprint", 1, topic_fingerprint, deterministic=True)
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection, opening one if the pool is empty."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _with_retry(self, operation: Callable):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or attempt == self.max_retries:
+                    raise
+                time.sleep(min(2.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _read(self, fn: Callable[[sqlite3.Connection], object]):
+        """Run fn(conn) outside an explicit transaction, retrying on lock contention."""
+        def operation():
+            with self._connection() as conn:
+                return fn(conn)
+        return self._with_retry(operation)
+
+    def _write(self, fn: Callable[[sqlite3.Connection], object]):
+        """Run fn(conn) in one write transaction, retrying on lock contention."""
+        def operation():
+            with self._connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn)
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+                return result
+        return self._with_retry(operation)
+
+    def close(self):
+        """Stop background maintenance and close all pooled connections."""
+        self.stop_maintenance()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
 
     def init_db(self):
         """Initialize database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        # Only takes effect on a new file; existing files are converted below
+        self._read(lambda conn: conn.execute("PRAGMA auto_vacuum=INCREMENTAL"))
+        self._write(self._create_schema)
+        if self._read(lambda conn: conn.execute("PRAGMA auto_vacuum").fetchone()[0]) != 2:
+            # One full VACUUM switches an existing file to incremental auto-vacuum
+            self._read(lambda conn: conn.execute("VACUUM"))
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS research_cache (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                report TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Add index for faster topic searches
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_topic 
+            ON research_cache(topic)
+        """)
+        # Latest report for each normalized topic, one row per fingerprint
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS topic_fingerprints (
+                fingerprint TEXT PRIMARY KEY,
+                research_id INTEGER NOT NULL
+            )
+        """)
+        self._migrate(conn)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Bring an existing database file up to SCHEMA_VERSION."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Index reports cached before fingerprints existed, newest wins
+            rows = conn.execute("SELECT id, topic FROM research_cache ORDER BY id").fetchall()
+            conn.executemany(
+                "INSERT OR REPLACE INTO topic_fingerprints (fingerprint, research_id) VALUES (?, ?)",
+                [(topic_fingerprint(topic), research_id) for research_id, topic in rows]
+            )
+        if version < 2:
+            # Report size kept alongside the row so listings never read report bodies
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(research_cache)")}
+            if "report_size" not in columns:
+                conn.execute("ALTER TABLE research_cache ADD COLUMN report_size INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE research_cache SET report_size = length(CAST(report AS BLOB))")
+        # Version 3 added the full-text index; the version 5 step rebuilds it over compressed bodies
+        if version < 4:
+            self._create_similarity_index(conn)
+        if version < 5:
+            self._migrate_report_blobs(conn)
+        if version < 6:
+            self._create_retention_schema(conn)
+        if version < 7:
+            # Stage outputs (findings["research"], findings["analysis"]) behind each report
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS research_cache (
-                    id INTEGER PRIMARY KEY,
-                    topic TEXT NOT NULL,
-                    report TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                CREATE TABLE IF NOT EXISTS report_findings (
+                    research_id INTEGER PRIMARY KEY REFERENCES research_cache(id) ON DELETE CASCADE,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL
                 )
             """)
-            # Add index for faster topic searches
+        if version < 8:
+            # One row per telemetry.Span: agent node or supervisor decision of a run
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_topic 
-                ON research_cache(topic)
+                CREATE TABLE IF NOT EXISTS run_metrics (
+                    span_id TEXT PRIMARY KEY,
+                    run_id TEXT,
+                    topic TEXT,
+                    node TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    retries INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    model TEXT
+                )
             """)
-            conn.commit()
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_run_metrics_run ON run_metrics(run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_run_metrics_started ON run_metrics(started_at)")
+        if version < 9:
+            # Background research runs, see jobs.JobQueue
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS research_jobs (
+                    id INTEGER PRIMARY KEY,
+                    topic TEXT NOT NULL,
+                    thread_id TEXT NOT NULL,
+                    params TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    resume INTEGER NOT NULL DEFAULT 0,
+                    stages TEXT NOT NULL DEFAULT '{}',
+                    research_id INTEGER REFERENCES research_cache(id) ON DELETE SET NULL,
+                    prompt_tokens TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_research_jobs_status ON research_jobs(status, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_research_jobs_research ON research_jobs(research_id)")
+        if version < 10:
+            # Each JobQueue (the app, the HTTP service) only runs and recovers its own jobs
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(research_jobs)")}
+            if "queue" not in columns:
+                conn.execute("ALTER TABLE research_jobs ADD COLUMN queue TEXT NOT NULL DEFAULT 'app'")
+            conn.execute("DROP INDEX IF EXISTS idx_research_jobs_status")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_research_jobs_queue ON research_jobs(queue, status, id)")
+        if 4 <= version < 11:
+            # LSH bands went from 32 of 2 rows to 16 of 3, so every band key changed
+            conn.execute("DELETE FROM topic_lsh")
+            self._create_similarity_index(conn)
+        if version < 11:
+            # Similarity candidates and the delete trigger look fingerprints up by report
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_topic_fingerprints_research ON topic_fingerprints(research_id)"
+            )
+        if version < 12:
+            self._migrate_findings(conn)
+        if version < 13:
+            self._store_topic_fingerprints(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _create_search_index(self, conn: sqlite3.Connection):
+        """Full-text index over topics and reports, kept in sync by triggers.
 
-    def cache_research(self, topic: str, report: str):
-        with sqlite3.connect(self.db_path) as conn:
+        Report bodies are compressed, so the index reads them through the
+        research_docs view, which decompresses on the fly.
+        """
+        conn.execute("""
+            CREATE VIEW IF NOT EXISTS research_docs AS
+            SELECT r.id, r.topic, decompress_report(b.codec, b.data) AS report
+            FROM research_cache r JOIN report_blobs b ON b.hash = r.report_hash
+        """)
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS research_fts USING fts5(
+                topic, report,
+                content='research_docs', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS research_fts_insert AFTER INSERT ON research_cache BEGIN
+                INSERT INTO research_fts(rowid, topic, report)
+                SELECT new.id, new.topic, decompress_report(codec, data)
+                FROM report_blobs WHERE hash = new.report_hash;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS research_fts_delete AFTER DELETE ON research_cache BEGIN
+                INSERT INTO research_fts(research_fts, rowid, topic, report)
+                SELECT 'delete', old.id, old.topic, decompress_report(codec, data)
+                FROM report_blobs WHERE hash = old.report_hash;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS research_fts_update AFTER UPDATE OF topic, report_hash ON research_cache BEGIN
+                INSERT INTO research_fts(research_fts, rowid, topic, report)
+                SELECT 'delete', old.id, old.topic, decompress_report(codec, data)
+                FROM report_blobs WHERE hash = old.report_hash;
+                INSERT INTO research_fts(rowid, topic, report)
+                SELECT new.id, new.topic, decompress_report(codec, data)
+                FROM report_blobs WHERE hash = new.report_hash;
+            END
+        """)
+        conn.execute("INSERT INTO research_fts(research_fts) VALUES ('rebuild')")
+
+    def _migrate_report_blobs(self, conn: sqlite3.Connection):
+        """Move report bodies into compressed, content-addressed report_blobs."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS report_blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL,
+                raw_size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(research_cache)")}
+        if "report_hash" not in columns:
+            conn.execute("ALTER TABLE research_cache ADD COLUMN report_hash TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_report_hash ON research_cache(report_hash)")
+        # The old triggers index research_cache.report, which is emptied below
+        for trigger in ("research_fts_insert", "research_fts_delete", "research_fts_update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS research_fts")
+
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, report FROM research_cache WHERE report_hash IS NULL AND id > ? ORDER BY id LIMIT 500",
+                (last_id,)
+            ).fetchall()
+            if not rows:
+                break
+            for research_id, report in rows:
+                # The legacy report column is kept, but empty, for older readers of the file
+                conn.execute("UPDATE research_cache SET report_hash = ?, report = '' WHERE id = ?",
+                             (self._store_blob(conn, report), research_id))
+            last_id = rows[-1][0]
+        if self.fts_enabled:
+            self._create_search_index(conn)
+
+    def _store_topic_fingerprints(self, conn: sqlite3.Connection):
+        """Keep each report's fingerprint, so a delete falls back to any spelling of the topic, not just its own."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(research_cache)")}
+        if "fingerprint" not in columns:
+            conn.execute("ALTER TABLE research_cache ADD COLUMN fingerprint TEXT")
+        conn.execute("UPDATE research_cache SET fingerprint = topic_fingerprint(topic) WHERE fingerprint IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_research_fingerprint ON research_cache(fingerprint, id)")
+        conn.execute("DROP TRIGGER IF EXISTS topic_fingerprints_delete")
+        conn.execute("""
+            CREATE TRIGGER topic_fingerprints_delete AFTER DELETE ON research_cache BEGIN
+                DELETE FROM topic_fingerprints WHERE research_id = old.id;
+                INSERT OR IGNORE INTO topic_fingerprints (fingerprint, research_id)
+                SELECT old.fingerprint, MAX(id) FROM research_cache
+                WHERE fingerprint = old.fingerprint HAVING MAX(id) IS NOT NULL;
+            END
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO topic_fingerprints (fingerprint, research_id)
+            SELECT fingerprint, MAX(id) FROM research_cache GROUP BY fingerprint
+        """)
+
+    def _migrate_findings(self, conn: sqlite3.Connection):
+        """Move findings into report_blobs, so equal findings are stored once, keeping only STORED_FINDINGS."""
+        conn.execute("ALTER TABLE report_findings RENAME TO report_findings_inline")
+        conn.execute("""
+            CREATE TABLE report_findings (
+                research_id INTEGER PRIMARY KEY REFERENCES research_cache(id) ON DELETE CASCADE,
+                findings_hash TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_report_findings_hash ON report_findings(findings_hash)")
+        rows = conn.execute("SELECT research_id, codec, data FROM report_findings_inline").fetchall()
+        for research_id, codec, data in rows:
+            self._store_findings(conn, research_id, json.loads(decompress_report(codec, data)))
+        conn.execute("DROP TABLE report_findings_inline")
+
+    def _create_retention_schema(self, conn: sqlite3.Connection):
+        """Access times for LRU eviction, and cleanup of rows that reference an evicted report."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(research_cache)")}
+        if "last_accessed" not in columns:
+            conn.execute("ALTER TABLE research_cache ADD COLUMN last_accessed TIMESTAMP")
+        conn.execute("UPDATE research_cache SET last_accessed = created_at WHERE last_accessed IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_last_accessed ON research_cache(last_accessed)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON research_cache(created_at)")
+        # A topic's fingerprint falls back to its newest remaining report
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS topic_fingerprints_delete AFTER DELETE ON research_cache BEGIN
+                DELETE FROM topic_fingerprints WHERE research_id = old.id;
+                INSERT OR IGNORE INTO topic_fingerprints (fingerprint, research_id)
+                SELECT topic_fingerprint(old.topic), MAX(id) FROM research_cache
+                WHERE topic = old.topic HAVING MAX(id) IS NOT NULL;
+            END
+        """)
+
+    def _store_blob(self, conn: sqlite3.Connection, report: str) -> str:
+        """Store a report body once per distinct content. Returns its hash."""
+        digest = report_hash(report)
+        if conn.execute("SELECT 1 FROM report_blobs WHERE hash = ?", (digest,)).fetchone() is None:
+            data = compress_report(report)
             conn.execute(
-                "INSERT INTO research_cache (topic, report) VALUES (?, ?)",
-                (topic, report)
+                "INSERT INTO report_blobs (hash, codec, data, raw_size, stored_size) VALUES (?, ?, ?, ?, ?)",
+                (digest, REPORT_CODEC, data, len(report.encode("utf-8")), len(data))
             )
-            conn.commit()
+        return digest
 
-    def get_recent_research(self, limit: int = 10) -> list:
-        with sqlite3.connect(self.db_path) as conn:
-            result = conn.execute(
-                "SELECT topic, report, created_at FROM research_cache ORDER BY created_at DESC LIMIT ?",
-                (limit,)
+    def _store_findings(self, conn: sqlite3.Connection, research_id: int, findings: Optional[dict]):
+        kept = stored_findings(findings)
+        if kept:
+            conn.execute(
+                "INSERT OR REPLACE INTO report_findings (research_id, findings_hash) VALUES (?, ?)",
+                (research_id, self._store_blob(conn, json.dumps(kept, ensure_ascii=False, sort_keys=True)))
+            )
+
+    def _create_similarity_index(self, conn: sqlite3.Connection):
+        """MinHash LSH band keys per report, so near-duplicate topics are found by index lookup."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS topic_lsh (
+                band_key INTEGER NOT NULL,
+                research_id INTEGER NOT NULL
             )
-            return [{"topic": row[0], "report": row[1], "date": row[2]} for row in result]
\ No newline at end of file
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_topic_lsh_band ON topic_lsh(band_key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_topic_lsh_research ON topic_lsh(research_id)")
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS topic_lsh_delete AFTER DELETE ON research_cache BEGIN
+                DELETE FROM topic_lsh WHERE research_id = old.id;
+            END
+        """)
+        rows = conn.execute(
+            "SELECT id, topic FROM research_cache WHERE id NOT IN (SELECT research_id FROM topic_lsh)"
+        ).fetchall()
+        for research_id, topic in rows:
+            self._index_topic(conn, research_id, topic)
+
+    def _index_topic(self, conn: sqlite3.Connection, research_id: int, topic: str):
+        conn.executemany(
+            "INSERT INTO topic_lsh (band_key, research_id) VALUES (?, ?)",
+            [(key, research_id) for key in band_keys(normalize_topic(topic))]
+        )
+
+    def _insert_research(self, conn: sqlite3.Connection, topic: str, report: str,
+                         findings: Optional[dict] = None) -> int:
+        fingerprint = topic_fingerprint(topic)
+        cursor = conn.execute(
+            """
+            INSERT INTO research_cache (topic, fingerprint, report, report_size, report_hash, last_accessed)
+            VALUES (?, ?, '', ?, ?, CURRENT_TIMESTAMP)
+            """,
+            (topic, fingerprint, len(report.encode("utf-8")), self._store_blob(conn, report))
+        )
+        conn.execute(
+            """
+            INSERT INTO topic_fingerprints (fingerprint, research_id) VALUES (?, ?)
+            ON CONFLICT(fingerprint) DO UPDATE SET research_id = excluded.research_id
+            """,
+            (fingerprint, cursor.lastrowid)
+        )
+        self._index_topic(conn, cursor.lastrowid, topic)
+        self._store_findings(conn, cursor.lastrowid, findings)
+        return cursor.lastrowid
+
+    def cache_research(self, topic: str, report: str, findings: Optional[dict] = None) -> int:
+        """Store a report, and optionally the stage findings it was written from. Returns its id.
+
+        Of the findings, only what regenerate_report needs (STORED_FINDINGS) is kept.
+        """
+        research_id = self._write(lambda conn: self._insert_research(conn, topic, report, findings))
+        self._generation += 1
+        return research_id
+
+    def cache_research_many(self, items: Iterable[tuple]) -> int:
+        """Insert (topic, report) or (topic, report, findings) tuples in a single transaction.
+
+        Returns the row count.
+        """
+        items = list(items)
+        def insert_all(conn):
+            for item in items:
+                self._insert_research(conn, *item)
+            return len(items)
+        count = self._write(insert_all)
+        self._generation += 1
+        return count
+
+    def get_cached_research(self, topic: str, max_age: Optional[int] = None) -> Optional[dict]:
+        """Return the latest report for an equivalent topic, or None on a miss.
+
+        max_age is in seconds and defaults to the database's cache_ttl.
+        """
+        max_age = self.cache_ttl if max_age is None else max_age
+        row = self._read(lambda conn: conn.execute(
+            """
+            SELECT r.id, r.topic, b.codec, b.data, r.created_at
+            FROM topic_fingerprints f JOIN research_cache r ON r.id = f.research_id
+            JOIN report_blobs b ON b.hash = r.report_hash
+            WHERE f.fingerprint = ?
+              AND (? IS NULL OR r.created_at >= datetime('now', ?))
+            """,
+            (topic_fingerprint(topic), max_age, f"-{max_age or 0} seconds")
+        ).fetchone())
+        if row is None:
+            return None
+        self.touch(row[0])
+        return {"id": row[0], "topic": row[1], "report": decompress_report(row[2], row[3]), "date": row[4]}
+
+    def get_cached_fingerprints(self, topics: List[str], max_age: Optional[int] = None) -> Set[str]:
+        """Fingerprints among topics that have a cached report younger than max_age."""
+        max_age = self.cache_ttl if max_age is None else max_age
+        fingerprints = list({topic_fingerprint(topic) for topic in topics})
+
+        def query(conn):
+            found = set()
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(fingerprints), 500):
+                chunk = fingerprints[start:start + 500]
+                rows = conn.execute(
+                    f"""
+                    SELECT f.fingerprint
+                    FROM topic_fingerprints f JOIN research_cache r ON r.id = f.research_id
+                    WHERE f.fingerprint IN ({", ".join("?" * len(chunk))})
+                      AND (? IS NULL OR r.created_at >= datetime('now', ?))
+                    """,
+                    (*chunk, max_age, f"-{max_age or 0} seconds")
+                )
+                found.update(row[0] for row in rows)
+            return found
+        return self._read(query)
+
+    def find_similar_research(self, topic: str, threshold: float = 0.4, limit: int = 3,
+                              max_candidates: int = 200, max_postings: int = 2000) -> list:
+        """Reports on topics that closely resemble topic, most similar first.
+
+        Candidates come from the LSH band index (topics sharing at least one
+        band). At most max_postings band matches are read, then ranked by how
+        many bands they share and capped at max_candidates, so the cost does
+        not grow with the size of the cache. Each candidate is then scored by
+        exact shingle Jaccard similarity; hits below threshold are dropped.
+        Only the latest report per normalized topic is returned. Each hit
+        carries id, topic, date, size and similarity.
+        """
+        normalized = normalize_topic(topic)
+        keys = band_keys(normalized)
+
+        def query(conn):
+            return conn.execute(
+                f"""
+                SELECT r.id, r.topic, r.created_at, r.report_size
+                FROM (
+                    SELECT research_id, COUNT(*) AS shared FROM (
+                        SELECT research_id FROM topic_lsh
+                        WHERE band_key IN ({", ".join("?" * len(keys))}) LIMIT ?
+                    )
+                    GROUP BY research_id ORDER BY shared DESC, research_id DESC LIMIT ?
+                ) c
+                JOIN research_cache r ON r.id = c.research_id
+                JOIN topic_fingerprints f ON f.research_id = r.id
+                """,
+                (*keys, max_postings, max_candidates)
+            ).fetchall()
+
+        shingles = topic_shingles(normalized)
+        hits = []
+        for research_id, other, created_at, size in self._read(query):
+            similarity = jaccard(shingles, topic_shingles(normalize_topic(other)))
+            if similarity >= threshold:
+                hits.append({"id": research_id, "topic": other, "date": created_at, "size": size,
+                             "similarity": round(similarity, 3)})
+        hits.sort(key=lambda hit: (hit["similarity"], hit["id"]), reverse=True)
+        return hits[:limit]
+
+    def get_recent_research(self, limit: int = 10) -> list:
+        rows = self._read(lambda conn: conn.execute(
+            """
+            SELECT r.topic, b.codec, b.data, r.created_at
+            FROM research_cache r JOIN report_blobs b ON b.hash = r.report_hash
+            ORDER BY r.created_at DESC LIMIT ?
+            """,
+            (limit,)
+        ).fetchall())
+        return [{"topic": row[0], "report": decompress_report(row[1], row[2]), "date": row[3]} for row in rows]
+
+    def change_token(self) -> tuple:
+        """Cheap value that changes whenever reports are added or removed.
+
+        Combines this instance's write counter with the newest row id, so
+        inserts from other processes (e.g. the batch runner) are noticed too.
+        """
+        newest = self._read(lambda conn: conn.execute("SELECT MAX(id) FROM research_cache").fetchone()[0])
+        return (self._generation, newest)
+
+    def list_research(self, limit: int = 10, before_id: Optional[int] = None) -> list:
+        """Newest-first report metadata (id, topic, date, size) without report bodies.
+
+        Pass the smallest id of the previous page as before_id to get the next
+        page (keyset pagination, so deep pages cost the same as the first).
+        """
+        rows = self._read(lambda conn: conn.execute(
+            """
+            SELECT id, topic, created_at, report_size FROM research_cache
+            WHERE (? IS NULL OR id < ?)
+            ORDER BY id DESC LIMIT ?
+            """,
+            (before_id, before_id, limit)
+        ).fetchall())
+        return [{"id": row[0], "topic": row[1], "date": row[2], "size": row[3]} for row in rows]
+
+    def touch(self, research_id: int):
+        """Mark a report as just used, so LRU eviction keeps it longer."""
+        self._write(lambda conn: conn.execute(
+            "UPDATE research_cache SET last_accessed = CURRENT_TIMESTAMP WHERE id = ?", (research_id,)
+        ))
+
+    def get_report(self, research_id: int) -> Optional[dict]:
+        """Load one report, including its body, by id, and record the access."""
+        row = self._read(lambda conn: conn.execute(
+            """
+            SELECT r.id, r.topic, b.codec, b.data, r.created_at
+            FROM research_cache r JOIN report_blobs b ON b.hash = r.report_hash
+            WHERE r.id = ?
+            """,
+            (research_id,)
+        ).fetchone())
+        if row is None:
+            return None
+        self.touch(research_id)
+        return {"id": row[0], "topic": row[1], "report": decompress_report(row[2], row[3]), "date": row[4]}
+
+    def storage_stats(self) -> dict:
+        """Report storage accounting: raw bytes of all reports and findings vs. bytes actually stored.
+
+        raw_bytes counts every cached report and its findings at full size;
+        stored_bytes counts each distinct body or findings payload once,
+        compressed, and findings_bytes is the findings' share of it.
+        bytes_saved is the difference.
+        """
+        def query(conn):
+            reports, raw, unique_reports = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(report_size), 0), COUNT(DISTINCT report_hash) FROM research_cache"
+            ).fetchone()
+            findings_raw = conn.execute(
+                """
+                SELECT COALESCE(SUM(b.raw_size), 0)
+                FROM report_findings f JOIN report_blobs b ON b.hash = f.findings_hash
+                """
+            ).fetchone()[0]
+            findings_stored = conn.execute(
+                """
+                SELECT COALESCE(SUM(stored_size), 0) FROM report_blobs
+                WHERE hash IN (SELECT findings_hash FROM report_findings)
+                """
+            ).fetchone()[0]
+            unique_raw, stored = conn.execute(
+                "SELECT COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) FROM report_blobs"
+            ).fetchone()
+            return reports, raw + findings_raw, unique_reports, unique_raw, stored, findings_stored
+        reports, raw, unique_reports, unique_raw, stored, findings_stored = self._read(query)
+        return {
+            "reports": reports,
+            "unique_reports": unique_reports,
+            "raw_bytes": raw,
+            "unique_raw_bytes": unique_raw,
+            "stored_bytes": stored,
+            "findings_bytes": findings_stored,
+            "bytes_saved": raw - stored,
+            "compression_ratio": round(unique_raw / stored, 2) if stored else None,
+            "codec": REPORT_CODEC,
+        }
+
+    def _delete_reports(self, conn: sqlite3.Connection, ids: List[int]) -> int:
+        """Delete reports by id, with the compressed bodies and findings no other report shares.
+
+        Triggers clean up the search index, LSH keys and fingerprints.
+        """
+        placeholders = ", ".join("?" * len(ids))
+        hashes = [row[0] for row in conn.execute(
+            f"""
+            SELECT report_hash FROM research_cache WHERE id IN ({placeholders})
+            UNION SELECT findings_hash FROM report_findings WHERE research_id IN ({placeholders})
+            """,
+            ids + ids
+        )]
+        deleted = conn.execute(f"DELETE FROM research_cache WHERE id IN ({placeholders})", ids).rowcount
+        conn.executemany(
+            """
+            DELETE FROM report_blobs WHERE hash = ?
+              AND NOT EXISTS (SELECT 1 FROM research_cache WHERE report_hash = report_blobs.hash)
+              AND NOT EXISTS (SELECT 1 FROM report_findings WHERE findings_hash = report_blobs.hash)
+            """,
+            [(digest,) for digest in hashes]
+        )
+        return deleted
+
+    def _eviction_batch(self, conn: sqlite3.Connection, batch_size: int) -> List[int]:
+        """Ids of the next reports to evict: expired ones first, then least recently used."""
+        if self.max_age is not None:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM research_cache WHERE created_at < datetime('now', ?) ORDER BY created_at LIMIT ?",
+                (f"-{self.max_age} seconds", batch_size)
+            )]
+            if ids:
+                return ids
+        if self.max_rows is not None:
+            excess = conn.execute("SELECT COUNT(*) FROM research_cache").fetchone()[0] - self.max_rows
+            if excess > 0:
+                return [row[0] for row in conn.execute(
+                    "SELECT id FROM research_cache ORDER BY last_accessed, id LIMIT ?",
+                    (min(excess, batch_size),)
+                )]
+        if self.max_bytes is not None:
+            excess = conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM report_blobs").fetchone()[0] \
+                - self.max_bytes
+            ids = []
+            if excess > 0:
+                rows = conn.execute(
+                    """
+                    SELECT r.id, b.stored_size + COALESCE(fb.stored_size, 0)
+                    FROM research_cache r JOIN report_blobs b ON b.hash = r.report_hash
+                    LEFT JOIN report_findings f ON f.research_id = r.id
+                    LEFT JOIN report_blobs fb ON fb.hash = f.findings_hash
+                    ORDER BY r.last_accessed, r.id LIMIT ?
+                    """,
+                    (batch_size,)
+                )
+                for research_id, stored_size in rows:
+                    ids.append(research_id)
+                    excess -= stored_size
+                    if excess <= 0:
+                        break
+            return ids
+        return []
+
+    def evict(self, batch_size: int = 200) -> int:
+        """Evict one batch of reports that break the retention limits. Returns the count."""
+        def evict_batch(conn):
+            ids = self._eviction_batch(conn, batch_size)
+            return self._delete_reports(conn, ids) if ids else 0
+        deleted = self._write(evict_batch)
+        if deleted:
+            self._generation += 1
+        return deleted
+
+    def incremental_vacuum(self, max_pages: int = 1000) -> int:
+        """Return up to max_pages free pages to the file system. Returns the number freed."""
+        def vacuum(conn):
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return self._read(vacuum)
+
+    def run_maintenance(self, batch_size: int = 200, vacuum_pages: int = 1000) -> dict:
+        """Evict batch by batch until within the retention limits, then shrink the file.
+
+        Every batch is its own short transaction, so other readers and writers
+        are never held up for long.
+        """
+        evicted = 0
+        while not self._stop_maintenance.is_set():
+            deleted = self.evict(batch_size)
+            evicted += deleted
+            if not deleted:
+                break
+        return {"evicted": evicted, "vacuumed_pages": self.incremental_vacuum(vacuum_pages)}
+
+    def start_maintenance(self):
+        """Run run_maintenance() every maintenance_interval seconds in a daemon thread."""
+        if self._maintenance_thread and self._maintenance_thread.is_alive():
+            return
+        self._stop_maintenance.clear()
+
+        def loop():
+            while True:
+                try:
+                    self.run_maintenance()
+                except sqlite3.Error:
+                    # Transient failures are retried on the next tick
+                    pass
+                if self._stop_maintenance.wait(self.maintenance_interval):
+                    return
+
+        self._maintenance_thread = threading.Thread(target=loop, name="research-cache-maintenance", daemon=True)
+        self._maintenance_thread.start()
+
+    def stop_maintenance(self):
+        self._stop_maintenance.set()
+        if self._maintenance_thread:
+            self._maintenance_thread.join()
+            self._maintenance_thread = None
+        self._stop_maintenance.clear()
+
+    def get_findings(self, research_id: int) -> Optional[dict]:
+        """Stage findings stored with a report, or None if it has none."""
+        row = self._read(lambda conn: conn.execute(
+            """
+            SELECT b.codec, b.data FROM report_findings f JOIN report_blobs b ON b.hash = f.findings_hash
+            WHERE f.research_id = ?
+            """,
+            (research_id,)
+        ).fetchone())
+        if row is None:
+            return None
+        return json.loads(decompress_report(row[0], row[1]))
+
+    def record_spans(self, spans: Iterable[dict]) -> int:
+        """Store telemetry spans; spans already recorded (e.g. before a resume) are skipped."""
+        columns = ("span_id", "run_id", "topic", "node", "started_at", "duration", "prompt_tokens",
+                   "completion_tokens", "retries", "error", "model")
+        rows = [tuple(span.get(column) for column in columns) for span in spans]
+        if not rows:
+            return 0
+        return self._write(lambda conn: conn.executemany(
+            f"INSERT OR IGNORE INTO run_metrics ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows
+        ).rowcount)
+
+    def get_run_metrics(self, since: Optional[float] = None, limit: int = 20000) -> list:
+        """Spans started after since (a Unix time), newest first."""
+        rows = self._read(lambda conn: conn.execute(
+            """
+            SELECT run_id, topic, node, started_at, duration, prompt_tokens, completion_tokens,
+                   retries, error, model
+            FROM run_metrics WHERE started_at >= ? ORDER BY started_at DESC LIMIT ?
+            """,
+            (since or 0, limit)
+        ).fetchall())
+        return [{"run_id": row[0], "topic": row[1], "node": row[2], "started_at": row[3], "duration": row[4],
+                 "prompt_tokens": row[5], "completion_tokens": row[6], "retries": row[7], "error": row[8],
+                 "model": row[9]} for row in rows]
+
+    def _job(self, row: Optional[tuple]) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["stages"] = json.loads(job["stages"])
+        job["prompt_tokens"] = json.loads(job["prompt_tokens"]) if job["prompt_tokens"] else {}
+        job["resume"] = bool(job["resume"])
+        return job
+
+    def create_job(self, topic: str, thread_id: str, params: Optional[dict] = None, queue: str = "app") -> int:
+        """Queue a research run; params are the run_research_team options. Returns the job id."""
+        return self._write(lambda conn: conn.execute(
+            "INSERT INTO research_jobs (queue, topic, thread_id, params, created_at) VALUES (?, ?, ?, ?, ?)",
+            (queue, topic, thread_id, json.dumps(params or {}), time.time())
+        ).lastrowid)
+
+    def claim_job(self, queue: str = "app") -> Optional[dict]:
+        """Atomically mark the oldest queued job running and return it, or None if none is queued."""
+        return self._job(self._write(lambda conn: conn.execute(
+            f"""
+            UPDATE research_jobs SET status = 'running', started_at = ?, error = NULL
+            WHERE id = (SELECT id FROM research_jobs WHERE queue = ? AND status = 'queued' ORDER BY id LIMIT 1)
+            RETURNING {', '.join(JOB_COLUMNS)}
+            """,
+            (time.time(), queue)
+        ).fetchone()))
+
+    def update_job_stages(self, job_id: int, stages: dict):
+        """Record per-stage progress: {"research": "done", "analysis": "running", ...}."""
+        self._write(lambda conn: conn.execute(
+            "UPDATE research_jobs SET stages = ? WHERE id = ?", (json.dumps(stages), job_id)
+        ))
+
+    def finish_job(self, job_id: int, status: str, research_id: Optional[int] = None,
+                   error: Optional[str] = None, prompt_tokens: Optional[dict] = None):
+        """Record a job's outcome: "done" with the report's research_id, or "failed" with an error."""
+        self._write(lambda conn: conn.execute(
+            """
+            UPDATE research_jobs SET status = ?, research_id = ?, error = ?, prompt_tokens = ?, finished_at = ?
+            WHERE id = ?
+            """,
+            (status, research_id, error, json.dumps(prompt_tokens) if prompt_tokens else None, time.time(), job_id)
+        ))
+
+    def requeue_job(self, job_id: int, queue: str = "app") -> bool:
+        """Queue a failed job again; it resumes from its checkpoints. False if it had not failed."""
+        return self._write(lambda conn: conn.execute(
+            """
+            UPDATE research_jobs SET status = 'queued', resume = 1, error = NULL, finished_at = NULL
+            WHERE id = ? AND queue = ? AND status = 'failed'
+            """,
+            (job_id, queue)
+        ).rowcount) > 0
+
+    def recover_jobs(self, queue: str = "app") -> int:
+        """Queue jobs left running by a stopped process again, to resume where they were cut off."""
+        return self._write(lambda conn: conn.execute(
+            "UPDATE research_jobs SET status = 'queued', resume = 1 WHERE queue = ? AND status = 'running'",
+            (queue,)
+        ).rowcount)
+
+    def prune_jobs(self, max_age: int) -> int:
+        """Delete finished jobs older than max_age seconds. Returns the count."""
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM research_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - max_age,)
+        ).rowcount)
+
+    def get_job(self, job_id: int, queue: str = "app") -> Optional[dict]:
+        """The job with job_id, or None if there is none in queue."""
+        return self._job(self._read(lambda conn: conn.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM research_jobs WHERE id = ? AND queue = ?", (job_id, queue)
+        ).fetchone()))
+
+    def list_jobs(self, statuses: Iterable[str] = ("queued", "running"), limit: int = 50,
+                  queue: str = "app") -> list:
+        """Jobs of queue in any of statuses, oldest first."""
+        statuses = list(statuses)
+        rows = self._read(lambda conn: conn.execute(
+            f"""
+            SELECT {', '.join(JOB_COLUMNS)} FROM research_jobs
+            WHERE queue = ? AND status IN ({', '.join('?' * len(statuses))}) ORDER BY id LIMIT ?
+            """,
+            (queue, *statuses, limit)
+        ).fetchall())
+        return [self._job(row) for row in rows]
+
+    def count_jobs(self, statuses: Iterable[str] = ("queued", "running"), queue: str = "app") -> int:
+        statuses = list(statuses)
+        return self._read(lambda conn: conn.execute(
+            f"SELECT COUNT(*) FROM research_jobs WHERE queue = ? AND status IN ({', '.join('?' * len(statuses))})",
+            (queue, *statuses)
+        ).fetchone()[0])
+
+    def search_research(self, query: str, limit: int = 20) -> list:
+        """Rank reports against free-text query with BM25, best first.
+
+        Topic matches weigh more than body matches. Each hit carries id, topic,
+        date, size and a snippet with matches in **bold**.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        if not self.fts_enabled:
+            rows = self._read(lambda conn: conn.execute(
+                """
+                SELECT id, topic, created_at, report_size, '' FROM research_cache
+                WHERE topic LIKE ? ORDER BY id DESC LIMIT ?
+                """,
+                (f"%{query.strip()}%", limit)
+            ).fetchall())
+        else:
+            rows = self._read(lambda conn: conn.execute(
+                """
+                SELECT r.id, r.topic, r.created_at, r.report_size,
+                       snippet(research_fts, 1, '**', '**', ' … ', 16)
+                FROM research_fts JOIN research_cache r ON r.id = research_fts.rowid
+                WHERE research_fts MATCH ?
+                ORDER BY bm25(research_fts, 10.0, 1.0) LIMIT ?
+                """,
+                (match, limit)
+            ).fetchall())
+        return [{"id": row[0], "topic": row[1], "date": row[2], "size": row[3], "snippet": row[4]}
+                for row in rows]
@@ -19,6 +19,7 @@ def show_documentation():
             * 📝 Writing Phase
     
     3. **Viewing Results**
+        - The report streams in while the writer is composing it
         - The final report will appear below the research area
         - Download options:
             * Markdown format (.md)
@@ -26,7 +27,9 @@ def show_documentation():
     
     4. **Managing Reports**
         - Access previous reports from the sidebar
+        - Search all past reports by words in their topic or text
         - Clear output using the "Clear Previous Output" button
+        - Use "Regenerate report" to rewrite a report for another audience or length; only the writer runs again
         - Each report is automatically saved for future reference
     """)
     
@@ -36,9 +39,16 @@ def show_documentation():
         * Research Specialist
         * Data Analyst
         * Report Writer
+        * Broad topics are split into sub-questions researched in parallel
     
     - **Automatic Caching**
         * All research results are cached
+        * Repeat topics are served from the cache instead of re-running the agents
+        * Topics match regardless of case, spacing and punctuation
+        * Reports on similar topics are offered before a new run; tune the threshold in the sidebar
+        * Reports are stored compressed, and identical reports are stored only once
+        * Set the cache age or force a refresh from the sidebar
+        * Each agent's replies are cached too, so re-runs only call Gemini for stages whose input changed
         * Quick access to previous reports
     
     - **Export Options**
@@ -48,6 +58,12 @@ def show_documentation():
     - **Progress Tracking**
         * Real-time progress indicators
         * Phase completion notifications
+        * Runs continue in the background while you browse other reports or refresh the page
+
+    - **Performance Tab**
+        * Latency (p50/p95) of every agent and supervisor step
+        * Tokens per run and estimated cost over time
+        * Gemini rate limiting: queued calls, retries and queueing delay
     """)
     
     st.header("Troubleshooting")
@@ -59,15 +75,25 @@ def show_documentation():
         - Check if the Gemini API is enabled
         - Verify your project has billing enabled
     
-    2. **No Results**
+    2. **Interrupted or Failed Runs**
+        - Progress is saved after every phase
+        - Use "Retry" on a failed run to continue where it stopped
+        - Runs cut off by a server restart resume automatically when the server has a
+          GOOGLE_API_KEY; otherwise they fail and "Retry" with your key continues them
+        - Only the unfinished phases are run again
+
+    3. **No Results**
         - Try rephrasing your research topic
         - Ensure your topic is specific enough
         - Check your internet connection
     
-    3. **Slow Response**
+    4. **Slow Response**
         - Complex topics may take longer to process
         - Multiple agents work sequentially
         - Wait for all phases to complete
+        - Keep "Supervisor routing" on "rules" to skip the supervisor's LLM calls
+        - Ask your administrator to set a latency budget, so late phases switch to a faster model
+        - Under heavy load Gemini calls queue up to stay within the API quota; rate-limited calls are retried automatically
     """)
     
     st.header("Contact & Support")
@@ -0,0 +1,153 @@
+import json
+import time
+from typing import Iterable, Iterator, Literal, Optional, Union
+from typing_extensions import TypedDict
+
+# Pipeline stage of each graph node
+STAGE_OF_NODE = {
+    "supervisor": "supervisor",
+    "researcher": "research",
+    "research_branch": "research",
+    "research_merge": "research",
+    "analyst": "analysis",
+    "writer": "writing",
+}
+
+class RunStarted(TypedDict):
+    type: Literal["run_started"]
+    run_id: str
+    topic: str
+    resumed: bool
+    timestamp: float
+
+class StageStarted(TypedDict):
+    """A graph node began; parallel research branches each get their own task_id."""
+    type: Literal["stage_started"]
+    run_id: str
+    stage: str
+    node: str
+    task_id: str
+    timestamp: float
+
+class StageFinished(TypedDict):
+    """A graph node completed, with its wall time, tokens and error (if the node failed)."""
+    type: Literal["stage_finished"]
+    run_id: str
+    stage: str
+    node: str
+    task_id: str
+    timestamp: float
+    duration: float
+    prompt_tokens: int
+    completion_tokens: int
+    error: Optional[str]
+
+class TokenDelta(TypedDict):
+    """Report text streamed by the writer since the previous token event."""
+    type: Literal["token"]
+    run_id: str
+    node: str
+    text: str
+
+class RunError(TypedDict):
+    """A node failed (fatal=False, the run goes on) or the run itself stopped (fatal=True)."""
+    type: Literal["error"]
+    run_id: str
+    node: Optional[str]
+    message: str
+    fatal: bool
+    timestamp: float
+
+class RunResult(TypedDict):
+    """Outcome of a run; status is "done" or "failed" (some stages failed)."""
+    type: Literal["result"]
+    run_id: str
+    status: str
+    timestamp: float
+    final_report: str
+    findings: dict
+    failed_stages: list
+    prompt_tokens: dict
+    spans: list
+
+ResearchEvent = Union[RunStarted, StageStarted, StageFinished, TokenDelta, RunError, RunResult]
+
+def run_started(run_id: str, topic: str, resumed: bool) -> RunStarted:
+    return {"type": "run_started", "run_id": run_id, "topic": topic, "resumed": resumed, "timestamp": time.time()}
+
+def stage_started(run_id: str, node: str, task_id: str) -> StageStarted:
+    return {"type": "stage_started", "run_id": run_id, "stage": STAGE_OF_NODE.get(node, node), "node": node,
+            "task_id": task_id, "timestamp": time.time()}
+
+def stage_finished(run_id: str, node: str, task_id: str, duration: float, span: Optional[dict] = None,
+                   error: Optional[str] = None) -> StageFinished:
+    """Timing and tokens come from the node's telemetry span when it recorded one."""
+    span = span or {}
+    return {
+        "type": "stage_finished",
+        "run_id": run_id,
+        "stage": STAGE_OF_NODE.get(node, node),
+        "node": node,
+        "task_id": task_id,
+        "timestamp": time.time(),
+        "duration": span.get("duration", duration),
+        "prompt_tokens": span.get("prompt_tokens", 0),
+        "completion_tokens": span.get("completion_tokens", 0),
+        "error": error or span.get("error"),
+    }
+
+def token_delta(run_id: str, node: str, text: str) -> TokenDelta:
+    return {"type": "token", "run_id": run_id, "node": node, "text": text}
+
+def run_error(run_id: str, message: str, node: Optional[str] = None, fatal: bool = True) -> RunError:
+    return {"type": "error", "run_id": run_id, "node": node, "message": message, "fatal": fatal,
+            "timestamp": time.time()}
+
+def run_result(run_id: str, state: dict) -> RunResult:
+    """Summary of a run's final state; the message history is left out."""
+    failed = state.get("failed_stages") or []
+    return {
+        "type": "result",
+        "run_id": run_id,
+        "status": "failed" if failed else "done",
+        "timestamp": time.time(),
+        "final_report": state.get("final_report", ""),
+        "findings": state.get("findings") or {},
+        "failed_stages": failed,
+        "prompt_tokens": state.get("prompt_tokens") or {},
+        "spans": state.get("spans") or [],
+    }
+
+def event_json(event: ResearchEvent) -> str:
+    """One-line JSON for logs and server-sent events."""
+    return json.dumps(event, ensure_ascii=False, default=str)
+
+def coalesce_tokens(events: Iterable[ResearchEvent], min_interval: float = 0.1) -> Iterator[ResearchEvent]:
+    """Merge token events so consumers redraw at most once per min_interval.
+
+    Other events pass through unchanged, after any text buffered before them.
+    """
+    pending = None
+    last = 0.0
+    for event in events:
+        if event["type"] == "token":
+            if pending is None:
+                pending = dict(event)
+            else:
+                pending["text"] += event["text"]
+            now = time.monotonic()
+            if now - last < min_interval:
+                continue
+            last = now
+            event = pending
+        elif pending is not None:
+            yield pending
+        pending = None
+        yield event
+    if pending is not None:
+        yield pending
+
+        pending = None
+        yield event
+    if pending is not None:
+        yield pending
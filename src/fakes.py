@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from message_store import estimate_tokens
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic offline stand-in for ChatGoogleGenerativeAI.
+
+    Replies are derived from a hash of the prompt, so identical prompts get
+    identical answers. latency is the simulated time per call in seconds and
+    output_chars the approximate reply length. Used by the batch runner,
+    benchmarks and the HTTP service to exercise the pipeline without Gemini.
+    """
+
+    latency: float = 0.0
+    output_chars: int = 2000
+    model: str = "fake-chat-model"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        system = str(messages[0].content) if messages else ""
+        if "Respond with just the name of the next agent" in system:
+            # Unrecognised routes fall back to the fixed workflow order
+            return "continue"
+        if "numbered list of questions" in system:
+            return "\n".join(f"{i}. Sub-question {i} about the topic?" for i in range(1, 4))
+
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = []
+        length = 0
+        while length < self.output_chars:
+            word = f"finding-{seed[len(words) % 56:len(words) % 56 + 8]}"
+            words.append(word)
+            length += len(word) + 1
+        body = " ".join(words)
+        return f"## Summary\n\n{body}\n\nrecommendations: review {seed[:8]}"
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        content = self._reply(messages)
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(content)
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }, response_metadata={"model_name": self.model})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _chunks(self, messages: List[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        message = self._message(messages)
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            # Usage is reported once, on the last chunk, like Gemini
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=text,
+                usage_metadata=message.usage_metadata if last else None,
+                response_metadata=message.response_metadata if last else {}
+            ))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,266 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Literal, Optional
+from typing_extensions import TypedDict
+from langchain_core.language_models import BaseChatModel
+from agents import run_research_team
+from checkpoints import DEFAULT_CHECKPOINT_PATH
+from database import Database
+from events import ResearchEvent
+from stage_models import StageModel
+
+JOB_STAGES = ("research", "analysis", "writing")
+# Finished jobs are kept this long so sessions can still pick up their result
+DEFAULT_JOB_RETENTION_SECONDS = 7 * 24 * 3600
+# Token events beyond this many undelivered ones are dropped for a slow subscriber
+MAX_BUFFERED_TOKENS = 256
+
+class JobFinished(TypedDict):
+    """Last event a job's subscribers get, once its outcome is stored."""
+    type: Literal["job_finished"]
+    job_id: int
+    status: str
+    research_id: Optional[int]
+    error: Optional[str]
+    timestamp: float
+
+def fold_progress(stages: Dict[str, str], event: ResearchEvent, open_nodes: Dict[str, int]) -> Dict[str, str]:
+    """Fold one research event into {stage: "running" | "done" | "failed"}; a failed stage stays failed.
+
+    open_nodes counts each stage's running nodes across calls. A stage is done
+    once none of its nodes is running and the run has moved on to another
+    stage, so fanned-out research stays running from the planner through every
+    research_branch until research_merge has finished.
+    """
+    stage = event.get("stage")
+    if event["type"] == "stage_started":
+        open_nodes[stage] = open_nodes.get(stage, 0) + 1
+    elif event["type"] == "stage_finished":
+        open_nodes[stage] = max(open_nodes.get(stage, 0) - 1, 0)
+    if event["type"] in ("stage_started", "result"):
+        for other, status in stages.items():
+            if other != stage and status == "running" and not open_nodes.get(other):
+                stages[other] = "done"
+    if stage not in JOB_STAGES or stages.get(stage) == "failed":
+        return stages
+    if event["type"] == "stage_started":
+        stages[stage] = "running"
+    elif event["type"] == "stage_finished" and event["error"]:
+        stages[stage] = "failed"
+    return stages
+
+class JobQueue:
+    """Runs research jobs from the research_jobs table on a pool of worker threads.
+
+    The Streamlit script only submits jobs and polls their rows, so reruns,
+    widget clicks and browser refreshes never stop a run. Each job has its own
+    checkpoint thread: jobs left running by a stopped server are queued again
+    on start() and resume from their last completed stage, as do failed jobs
+    passed to retry(). Queues with different names share a database file but
+    only run their own jobs; run one queue per name and file.
+
+    subscribe() delivers a job's research events as they happen, ending with
+    a JobFinished event.
+
+    API keys are held in memory only, never written to the job table; jobs
+    recovered after a restart fall back to GOOGLE_API_KEY, and fail asking
+    for a retry with a key if it is not set. stage_models and
+    latency_budget apply to every job, as in run_research_team.
+    """
+
+    def __init__(self, db: Database, workers: int = 2, name: str = "app", poll_interval: float = 1.0,
+                 checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, llm: Optional[BaseChatModel] = None,
+                 retention_seconds: int = DEFAULT_JOB_RETENTION_SECONDS,
+                 stage_models: Optional[Dict[str, StageModel]] = None, latency_budget: Optional[float] = None):
+        self.db = db
+        self.workers = workers
+        self.name = name
+        self.poll_interval = poll_interval
+        self.checkpoint_path = checkpoint_path
+        self.llm = llm
+        self.retention_seconds = retention_seconds
+        self.stage_models = stage_models
+        self.latency_budget = latency_budget
+        self._api_keys: Dict[int, str] = {}
+        # Writer tokens of running jobs, so pollers can show the report as it is written
+        self._live: Dict[int, List[str]] = {}
+        self._subscribers: Dict[int, List[queue.Queue]] = {}
+        self._subscribers_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, topic: str, api_key: Optional[str] = None, routing: str = "rules", research_fanout: int = 0,
+               response_cache_path: Optional[str] = None, response_max_age: Optional[int] = None) -> int:
+        """Queue a research run on topic and return its job id.
+
+        response_max_age limits which cached stage replies the run reuses, see run_research_team.
+        """
+        job_id = self.db.create_job(topic, f"research_{uuid.uuid4().hex}", {
+            "routing": routing,
+            "research_fanout": research_fanout,
+            "response_cache_path": response_cache_path,
+            "response_max_age": response_max_age
+        }, queue=self.name)
+        if api_key:
+            self._api_keys[job_id] = api_key
+        self._wake.set()
+        return job_id
+
+    def retry(self, job_id: int, api_key: Optional[str] = None) -> bool:
+        """Queue a failed job again; completed stages are not re-run. False if it had not failed."""
+        if api_key:
+            self._api_keys[job_id] = api_key
+        if not self.db.requeue_job(job_id, self.name):
+            return False
+        self._wake.set()
+        return True
+
+    def get(self, job_id: int) -> Optional[dict]:
+        """The job's row, plus live_report: the writer's text so far while it runs."""
+        job = self.db.get_job(job_id, self.name)
+        if job is not None:
+            job["live_report"] = "".join(self._live.get(job_id, []))
+        return job
+
+    def pending(self) -> int:
+        """Jobs of this queue waiting for or occupying a worker."""
+        return self.db.count_jobs(queue=self.name)
+
+    def subscribe(self, job_id: int) -> queue.Queue:
+        """A queue that receives the job's events from now on; pass it to unsubscribe() when done."""
+        events = queue.Queue()
+        with self._subscribers_lock:
+            self._subscribers.setdefault(job_id, []).append(events)
+        return events
+
+    def unsubscribe(self, job_id: int, events: queue.Queue):
+        with self._subscribers_lock:
+            subscribers = self._subscribers.get(job_id, [])
+            if events in subscribers:
+                subscribers.remove(events)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def _publish(self, job_id: int, event: dict):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers.get(job_id, []))
+        for events in subscribers:
+            if event["type"] == "token" and events.qsize() > MAX_BUFFERED_TOKENS:
+                continue
+            events.put_nowait(event)
+
+    def start(self):
+        """Recover jobs cut off by a previous process and start the worker threads."""
+        if self._threads:
+            return
+        self._stop.clear()
+        self.db.recover_jobs(self.name)
+        self.db.prune_jobs(self.retention_seconds)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"research-job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the workers once their current jobs finish."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.db.claim_job(self.name)
+            except sqlite3.Error as e:
+                # A busy or locked database is retried on the next poll; the worker keeps running
+                print(f"Job queue {self.name}: could not claim a job: {e}", file=sys.stderr)
+                self._stop.wait(self.poll_interval)
+                continue
+            if job is None:
+                # Woken early by submit(); the timeout picks up jobs queued by other processes
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                try:
+                    self.db.finish_job(job["id"], "failed", error=f"{type(e).__name__}: {e}")
+                except sqlite3.Error as db_error:
+                    # Left running, so the next start() queues the job again
+                    print(f"Job {job['id']}: could not record its failure: {db_error}", file=sys.stderr)
+            finally:
+                self._live.pop(job["id"], None)
+                self._publish(job["id"], self._finished_event(job["id"]))
+
+    def _finished_event(self, job_id: int) -> JobFinished:
+        try:
+            finished = self.db.get_job(job_id, self.name)
+        except sqlite3.Error as e:
+            print(f"Job {job_id}: could not read its outcome: {e}", file=sys.stderr)
+            finished = None
+        if finished is None:
+            finished = {"status": "failed", "research_id": None, "error": "The job's outcome could not be read."}
+        return {
+            "type": "job_finished",
+            "job_id": job_id,
+            "status": finished["status"],
+            "research_id": finished["research_id"],
+            "error": finished["error"],
+            "timestamp": time.time(),
+        }
+
+    def _run(self, job: dict):
+        job_id = job["id"]
+        api_key = self._api_keys.get(job_id) or os.getenv("GOOGLE_API_KEY")
+        if self.llm is None and not api_key:
+            self.db.finish_job(job_id, "failed", error="No Google API key; enter it and retry the job.")
+            return
+
+        # A retried job shows its failed and unfinished stages afresh
+        stages = {stage: status for stage, status in job["stages"].items() if status == "done"}
+        live = self._live.setdefault(job_id, [])
+        open_nodes: Dict[str, int] = {}
+
+        def on_event(event: ResearchEvent):
+            self._publish(job_id, event)
+            before = dict(stages)
+            # Only changes are written, so a job costs a few updates however many nodes run
+            if fold_progress(stages, event, open_nodes) != before:
+                self.db.update_job_stages(job_id, stages)
+
+        state = run_research_team(
+            job["topic"],
+            on_event,
+            thread_id=job["thread_id"],
+            resume=job["resume"],
+            api_key=api_key,
+            on_token=live.append,
+            llm=self.llm,
+            checkpoint_path=self.checkpoint_path,
+            stage_models=self.stage_models,
+            latency_budget=self.latency_budget,
+            **job["params"]
+        )
+        if not state:
+            self.db.finish_job(job_id, "failed", error="The research run stopped with an error.")
+            return
+        self.db.record_spans(state.get("spans", []))
+        if state.get("failed_stages"):
+            self.db.finish_job(job_id, "failed", prompt_tokens=state.get("prompt_tokens"),
+                               error=f"These stages failed: {', '.join(dict.fromkeys(state['failed_stages']))}.")
+            return
+        if not state.get("final_report"):
+            self.db.finish_job(job_id, "failed", error="The run finished without a report.")
+            return
+        research_id = self.db.cache_research(job["topic"], state["final_report"], state.get("findings"))
+        self.db.finish_job(job_id, "done", research_id=research_id, prompt_tokens=state.get("prompt_tokens"))
+        self._api_keys.pop(job_id, None)
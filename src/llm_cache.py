@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, ensure_config
+
+DEFAULT_RESPONSE_CACHE_PATH = "llm_cache.db"
+# Cached responses are reused for this long
+DEFAULT_RESPONSE_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_RESPONSES = 5000
+# Expired and surplus entries are pruned every this many writes
+PRUNE_EVERY = 100
+
+def response_key(model: str, temperature: float, messages: List[BaseMessage]) -> str:
+    """Hash of everything that determines a model's reply: model, temperature and the rendered prompt."""
+    payload = json.dumps({
+        "model": model,
+        "temperature": temperature,
+        # Message ids differ per run, so only role and content count
+        "messages": [[message.type, message.content] for message in messages]
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """SQLite memo of LLM responses per pipeline stage.
+
+    Entries expire after ttl_seconds; beyond max_entries the least recently
+    used are dropped. Hits and misses are counted per stage since startup.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_RESPONSE_CACHE_PATH, ttl_seconds: int = DEFAULT_RESPONSE_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_RESPONSES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = Counter()
+        self.misses = Counter()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                content TEXT NOT NULL,
+                usage TEXT,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses(last_accessed)")
+        self.prune()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            self.conn.commit()
+        return rows
+
+    def get(self, key: str, stage: str, max_age: Optional[int] = None) -> Optional[AIMessage]:
+        """The cached reply for key, or None on a miss or an expired entry.
+
+        max_age (seconds) further limits which entries count, down to none at 0.
+        """
+        max_age = self.ttl_seconds if max_age is None else min(max_age, self.ttl_seconds)
+        rows = self._execute(
+            """
+            UPDATE llm_responses SET hits = hits + 1, last_accessed = CURRENT_TIMESTAMP
+            WHERE key = ? AND created_at >= datetime('now', ?)
+            RETURNING content, usage
+            """,
+            (key, f"-{max_age} seconds")
+        ) if max_age > 0 else []
+        if not rows:
+            self.misses[stage] += 1
+            return None
+        self.hits[stage] += 1
+        content, usage = rows[0]
+        return AIMessage(content=content, usage_metadata=json.loads(usage) if usage else None,
+                         response_metadata={"cached": True})
+
+    def put(self, key: str, stage: str, response: AIMessage):
+        if not isinstance(response.content, str) or not response.content:
+            return
+        usage = json.dumps(dict(response.usage_metadata)) if response.usage_metadata else None
+        self._execute(
+            """
+            INSERT INTO llm_responses (key, stage, content, usage) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET content = excluded.content, usage = excluded.usage,
+                created_at = CURRENT_TIMESTAMP, last_accessed = CURRENT_TIMESTAMP
+            """,
+            (key, stage, response.content, usage)
+        )
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """Drop expired entries and the least recently used beyond max_entries. Returns the count."""
+        expired = self._execute(
+            "DELETE FROM llm_responses WHERE created_at < datetime('now', ?) RETURNING key",
+            (f"-{self.ttl_seconds} seconds",)
+        )
+        surplus = self._execute(
+            """
+            DELETE FROM llm_responses WHERE key IN (
+                SELECT key FROM llm_responses ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+            ) RETURNING key
+            """,
+            (self.max_entries,)
+        )
+        return len(expired) + len(surplus)
+
+    def clear(self):
+        self._execute("DELETE FROM llm_responses")
+
+    def stats(self) -> dict:
+        """Entry count plus hit and miss counters, overall and per stage."""
+        entries = self._execute("SELECT COUNT(*) FROM llm_responses")[0][0]
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "stages": {stage: {"hits": self.hits[stage], "misses": self.misses[stage]}
+                       for stage in sorted(set(self.hits) | set(self.misses))}
+        }
+
+def response_max_age(config=None) -> Optional[int]:
+    """The run's configurable["response_max_age"], set by stream_research_team; None when unset.
+
+    Without config, the config of the graph node being run is used.
+    """
+    return (ensure_config(config).get("configurable") or {}).get("response_max_age")
+
+class CachedChain:
+    """prompt | llm with replies memoized in a ResponseCache.
+
+    Drop-in for the chain inside chain_node: invoke/ainvoke render the prompt,
+    serve a stored reply for the same model, temperature and prompt, and only
+    call the model on a miss. Cache hits stream no tokens. model, if given,
+    is called in place of llm, e.g. llm wrapped by a scheduler; the cache key
+    still comes from llm. Only replies newer than the run's
+    configurable["response_max_age"] are served, when it is set.
+    """
+
+    def __init__(self, stage: str, prompt: ChatPromptTemplate, llm: BaseChatModel, cache: ResponseCache,
+                 model: Optional[Runnable] = None):
+        self.stage = stage
+        self.prompt = prompt
+        self.chain = prompt | (model or llm)
+        self.cache = cache
+        self.model = str(getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__)
+        self.temperature = getattr(llm, "temperature", None)
+
+    def _key(self, inputs: dict) -> str:
+        return response_key(self.model, self.temperature, self.prompt.format_messages(**inputs))
+
+    def invoke(self, inputs: dict, config=None) -> AIMessage:
+        key = self._key(inputs)
+        cached = self.cache.get(key, self.stage, response_max_age(config))
+        if cached is not None:
+            return cached
+        response = self.chain.invoke(inputs, config)
+        self.cache.put(key, self.stage, response)
+        return response
+
+    async def ainvoke(self, inputs: dict, config=None) -> AIMessage:
+        key = self._key(inputs)
+        cached = await asyncio.to_thread(self.cache.get, key, self.stage, response_max_age(config))
+        if cached is not None:
+            return cached
+        response = await self.chain.ainvoke(inputs, config)
+        await asyncio.to_thread(self.cache.put, key, self.stage, response)
+        return response
+
+def cached_chain(stage: str, prompt: ChatPromptTemplate, llm: BaseChatModel,
+                 cache: Optional[ResponseCache] = None, scheduler=None):
+    """prompt | llm, memoized when a cache is given.
+
+    With a scheduler.CallScheduler, calls that reach the model (not cache
+    hits) are rate limited and retried by it.
+    """
+    model = scheduler.wrap(llm) if scheduler else llm
+    if cache is None:
+        return prompt | model
+    return CachedChain(stage, prompt, llm, cache, model)
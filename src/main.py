@@ -1,38 +1,261 @@
-import streamlit as st
 import os
-from agents import run_research_team
+import streamlit as st
+from typing import List
+from agents import get_response_cache, regenerate_report
+from checkpoints import checkpoint_path_for
+from dashboard import show_performance_dashboard
 from database import Database
 from documentation import show_documentation
-from utils import format_to_plaintext, process_research_callback
+from jobs import JobQueue
+from llm_cache import DEFAULT_RESPONSE_CACHE_PATH
+from stage_models import parse_stage_models
+from utils import create_token_renderer, format_to_plaintext, show_job_progress
 from styles import PAGE_CONFIG, apply_custom_styling, create_footer
 
-# Initialize database
-db = Database()
+def env_number(name: str):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+# Initialize database once per server process; its connection pool is shared by all sessions
+@st.cache_resource
+def get_database() -> Database:
+    max_reports = env_number("SEARCHPRO_CACHE_MAX_REPORTS")
+    max_mb = env_number("SEARCHPRO_CACHE_MAX_MB")
+    max_age_days = env_number("SEARCHPRO_CACHE_MAX_AGE_DAYS")
+    return Database(
+        max_rows=int(max_reports) if max_reports is not None else None,
+        max_bytes=int(max_mb * 1024 ** 2) if max_mb is not None else None,
+        max_age=int(max_age_days * 86400) if max_age_days is not None else None
+    )
+
+db = get_database()
+
+# Per-agent model settings, e.g. {"writer": {"model": "gemini-2.5-pro"}}, and an end-to-end run budget in seconds
+STAGE_MODELS = parse_stage_models(os.getenv("SEARCHPRO_STAGE_MODELS"))
+LATENCY_BUDGET = env_number("SEARCHPRO_LATENCY_BUDGET")
+
+# Research runs execute on these workers, outside the script thread, so reruns never cut them off
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    workers = env_number("SEARCHPRO_JOB_WORKERS")
+    database = get_database()
+    job_queue = JobQueue(database, workers=int(workers) if workers else 2,
+                         checkpoint_path=checkpoint_path_for(database.db_path), stage_models=STAGE_MODELS,
+                         latency_budget=LATENCY_BUDGET)
+    job_queue.start()
+    return job_queue
+
+jobs = get_job_queue()
+
+JOB_POLL_SECONDS = 2.0
+
+HISTORY_PAGE_SIZE = 10
+
+def load_history_page(before_id):
+    """Sidebar history metadata, cached in the session until reports are added or removed."""
+    token = db.change_token()
+    cache = st.session_state.get("history_cache")
+    if not cache or cache["token"] != token:
+        cache = {"token": token, "pages": {}}
+        st.session_state["history_cache"] = cache
+    if before_id not in cache["pages"]:
+        # One extra row tells whether an older page exists
+        cache["pages"][before_id] = db.list_research(limit=HISTORY_PAGE_SIZE + 1, before_id=before_id)
+    return cache["pages"][before_id]
+
+def load_storage_stats():
+    """Report storage accounting, cached in the session until reports are added or removed."""
+    token = db.change_token()
+    cache = st.session_state.get("storage_stats")
+    if not cache or cache["token"] != token:
+        cache = {"token": token, "stats": db.storage_stats()}
+        st.session_state["storage_stats"] = cache
+    return cache["stats"]
+
+def open_report(research_id: int):
+    """Show a stored report; only now is its body read."""
+    if "current_report" in st.session_state:
+        del st.session_state["current_report"]
+    st.session_state["selected_report"] = db.get_report(research_id)
+    st.rerun()
+
+def plain_text_of(entry: dict) -> str:
+    """The report as plain text, converted once per entry rather than on every rerun."""
+    if "plain_text" not in entry:
+        entry["plain_text"] = format_to_plaintext(entry["report"])
+    return entry["plain_text"]
+
+def session_jobs() -> List[int]:
+    """Research jobs started from this browser tab, kept in the URL so a refresh still finds them."""
+    return [int(job_id) for job_id in st.query_params.get_all("job")]
+
+def set_session_jobs(job_ids: List[int]):
+    if job_ids:
+        st.query_params["job"] = [str(job_id) for job_id in job_ids]
+    elif "job" in st.query_params:
+        del st.query_params["job"]
+
+def retry_job(job_id: int, api_key: str):
+    jobs.retry(job_id, api_key=api_key)
+
+def dismiss_job(job_id: int):
+    set_session_jobs([other for other in session_jobs() if other != job_id])
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_jobs():
+    """Poll this tab's research jobs; a finished report is opened with a full rerun."""
+    for job_id in reversed(session_jobs()):
+        job = jobs.get(job_id)
+        if job is None:
+            dismiss_job(job_id)
+            continue
+        if job["status"] == "done":
+            dismiss_job(job_id)
+            report = db.get_report(job["research_id"]) if job["research_id"] else None
+            if report:
+                st.session_state.pop("selected_report", None)
+                st.session_state["current_report"] = {**report, "date": "Just now"}
+                st.session_state["research_notice"] = job["prompt_tokens"]
+            st.rerun()
+
+        with st.container(border=True):
+            st.markdown(f"**{job['topic']}**")
+            if job["status"] == "queued":
+                st.caption("⏳ Queued, waiting for a free research worker...")
+            show_job_progress(job["stages"])
+            if job["status"] == "running" and job["live_report"]:
+                st.markdown(job["live_report"] + " ▌")
+            if job["status"] == "failed":
+                st.error(f"{job['error']} Completed stages are saved, so a retry only re-runs the rest.")
+                retry_col, dismiss_col = st.columns(2)
+                retry_col.button("🔁 Retry", key=f"retry_job_{job_id}", on_click=retry_job, args=(job_id, api_key))
+                dismiss_col.button("Dismiss", key=f"dismiss_job_{job_id}", on_click=dismiss_job, args=(job_id,))
+
+AUDIENCES = ["General readers", "Executives", "Technical experts", "Students"]
+REPORT_LENGTHS = {"Brief": "about 300 words", "Standard": "about 800 words", "In-depth": "2000 words or more"}
+
+def show_regenerate(entry: dict, key: str, api_key: str):
+    """Rewrite a stored report for another audience or length, re-running only the writer."""
+    findings = db.get_findings(entry["id"]) if entry.get("id") else None
+    if not findings:
+        return
+    with st.expander("✏️ Regenerate report"):
+        st.caption("Rewrites the report from its saved research and analysis with a single writer call.")
+        audience = st.selectbox("Audience", AUDIENCES, key=f"{key}_audience")
+        length = st.selectbox("Length", list(REPORT_LENGTHS), index=1, key=f"{key}_length")
+        if not st.button("Regenerate", key=f"{key}_regenerate"):
+            return
+        if not api_key:
+            st.error("Please enter your Google API key in the sidebar first.")
+            return
+        live_report = st.empty()
+        with st.spinner("Rewriting report..."):
+            result = regenerate_report(entry["topic"], findings, audience=audience, length=REPORT_LENGTHS[length],
+                                       api_key=api_key, on_token=create_token_renderer(live_report),
+                                       stage_models=STAGE_MODELS)
+        live_report.empty()
+        db.record_spans(result.get("spans", []))
+        if result.get("failed_stages"):
+            st.error(result["final_report"])
+            return
+        research_id = db.cache_research(entry["topic"], result["final_report"], findings)
+        if "selected_report" in st.session_state:
+            del st.session_state["selected_report"]
+        st.session_state["current_report"] = {
+            "id": research_id,
+            "topic": entry["topic"],
+            "report": result["final_report"],
+            "date": "Just now"
+        }
+        st.rerun()
 
 # Configure page
 st.set_page_config(**PAGE_CONFIG)
 apply_custom_styling()
 
+def run_anyway():
+    """Dismiss the similar-report suggestions and run the pipeline on the next rerun."""
+    st.session_state.pop("similar_reports", None)
+    st.session_state["run_anyway"] = True
+
 # Create tabs for navigation
-tab1, tab2 = st.tabs(["🔍 Research", "📚 Documentation"])
+tab1, tab2, tab3 = st.tabs(["🔍 Research", "📚 Documentation", "📈 Performance"])
 
 with tab1:
     # Sidebar for API key and history
     with st.sidebar:
         st.subheader("API Configuration")
         api_key = st.text_input("Enter Google API Key", type="password")
+
+        st.subheader("Cache Settings")
+        cache_ttl_hours = st.number_input(
+            "Reuse cached reports newer than (hours)", min_value=0, value=24, step=1
+        )
+        force_refresh = st.checkbox("Force refresh (ignore cached reports)",
+                                    help="Also bypasses the per-stage LLM response cache.")
+        similarity_threshold = st.slider(
+            "Similar-topic threshold", min_value=0.1, max_value=1.0, value=0.4, step=0.05,
+            help="Before a new run, offer earlier reports whose topic is at least this similar. "
+                 "Higher values only suggest near-identical topics."
+        )
+        storage = load_storage_stats()
+        if storage["reports"]:
+            st.caption(
+                f"{storage['reports']:,} reports ({storage['unique_reports']:,} distinct) · "
+                f"{storage['stored_bytes'] / 1024 ** 2:.1f} MB stored, "
+                f"{max(storage['bytes_saved'], 0) / 1024 ** 2:.1f} MB saved by {storage['codec']} compression"
+            )
+
+        st.subheader("Agent Settings")
+        routing = st.selectbox(
+            "Supervisor routing",
+            ["rules", "llm"],
+            help="'rules' follows the fixed research → analysis → writing order without extra LLM calls. "
+                 "'llm' lets the model choose the next step."
+        )
+        research_fanout = st.slider(
+            "Parallel research sub-questions", min_value=0, max_value=8, value=3,
+            help="Split the topic into this many sub-questions researched in parallel. 0 uses a single research call."
+        )
+        stage_cache = get_response_cache(DEFAULT_RESPONSE_CACHE_PATH).stats()
+        if stage_cache["hits"] or stage_cache["misses"]:
+            st.caption(f"Stage response cache: {stage_cache['hits']} hits, {stage_cache['misses']} misses "
+                       f"({stage_cache['entries']:,} stored)")
         
+        st.markdown("---")
+        st.header("Search Reports")
+        search_query = st.text_input("Search past reports", key="report_search",
+                                     placeholder="Words from a topic or report")
+        if search_query.strip():
+            search_hits = db.search_research(search_query, limit=10)
+            if not search_hits:
+                st.caption("No matching reports.")
+            for hit in search_hits:
+                if st.button(f"🔎 {hit['topic']}", key=f"search_{hit['id']}", help=hit["date"]):
+                    open_report(hit["id"])
+                if hit["snippet"]:
+                    st.caption(hit["snippet"])
+
         st.markdown("---")
         st.header("Previous Reports")
-        recent_research = db.get_recent_research()
+        # Stack of page cursors; None is the newest page
+        history_cursors = st.session_state.setdefault("history_cursors", [None])
+        history_page = load_history_page(history_cursors[-1])
         
-        if recent_research:
-            for i, entry in enumerate(recent_research):
-                if st.button(f"📄 {entry['topic']}", key=f"history_{i}"):
-                    if "current_report" in st.session_state:
-                        del st.session_state["current_report"]
-                    st.session_state["selected_report"] = entry
-                    st.rerun()
+        for entry in history_page[:HISTORY_PAGE_SIZE]:
+            if st.button(f"📄 {entry['topic']}", key=f"history_{entry['id']}",
+                         help=f"{entry['date']} · {entry['size'] / 1024:.1f} KB"):
+                open_report(entry["id"])
+
+        newer_col, older_col = st.columns(2)
+        with newer_col:
+            if len(history_cursors) > 1 and st.button("◀ Newer", key="history_newer"):
+                history_cursors.pop()
+                st.rerun()
+        with older_col:
+            if len(history_page) > HISTORY_PAGE_SIZE and st.button("Older ▶", key="history_older"):
+                history_cursors.append(history_page[HISTORY_PAGE_SIZE - 1]["id"])
+                st.rerun()
 
     # Main research interface
     st.title("🤖 SearchPro Research Agent")
@@ -52,38 +275,64 @@ with tab1:
             del st.session_state["current_report"]
         if "selected_report" in st.session_state:
             del st.session_state["selected_report"]
+        st.session_state.pop("similar_reports", None)
         st.rerun()
 
-    if research_button and topic.strip():
+    cached = None
+    start_research = (research_button or st.session_state.pop("run_anyway", False)) and topic.strip()
+    if research_button:
+        st.session_state.pop("similar_reports", None)
+    if research_button and topic.strip() and not force_refresh:
+        cached = db.get_cached_research(topic, max_age=int(cache_ttl_hours * 3600))
+        if not cached:
+            similar = db.find_similar_research(topic, threshold=similarity_threshold)
+            if similar:
+                # Kept in the session so the open buttons still work on the next rerun
+                st.session_state["similar_reports"] = {"topic": topic, "hits": similar}
+    similar_reports = st.session_state.get("similar_reports")
+    if similar_reports and similar_reports["topic"] != topic:
+        st.session_state.pop("similar_reports", None)
+        similar_reports = None
+
+    if cached:
+        st.info("⚡ Served from cache. Tick \"Force refresh\" in the sidebar to run a new research.")
+        if "selected_report" in st.session_state:
+            del st.session_state["selected_report"]
+        st.session_state["current_report"] = cached
+    elif similar_reports:
+        st.info("📚 Earlier reports cover a similar topic. Open one instantly, or run a new research.")
+        for hit in similar_reports["hits"]:
+            if st.button(f"📄 {hit['topic']} · {hit['similarity']:.0%} similar", key=f"similar_{hit['id']}",
+                         help=f"{hit['date']} · {hit['size'] / 1024:.1f} KB"):
+                st.session_state.pop("similar_reports", None)
+                open_report(hit["id"])
+        st.button("▶️ Run new research anyway", on_click=run_anyway)
+    elif start_research:
         if not api_key:
             st.error("Please enter your Google API key in the sidebar first.")
         else:
-            os.environ["GOOGLE_API_KEY"] = api_key
-            
-            # Initialize progress tracking
-            spinners = {
-                "research": st.empty(),
-                "analysis": st.empty(),
-                "writing": st.empty()
-            }
-            
-            with st.spinner("Research in progress..."):
-                try:
-                    result = run_research_team(
-                        topic, 
-                        lambda state: process_research_callback(state, spinners)
-                    )
-                    
-                    if result and result.get("final_report"):
-                        st.success("✨ Research completed successfully!")
-                        db.cache_research(topic, result["final_report"])
-                        st.session_state["current_report"] = {
-                            "topic": topic,
-                            "report": result["final_report"],
-                            "date": "Just now"
-                        }
-                except Exception as e:
-                    st.error(f"An error occurred: {str(e)}")
+            job_id = jobs.submit(
+                topic,
+                api_key=api_key,
+                routing=routing,
+                research_fanout=research_fanout,
+                # Unchanged stages are served from disk; a forced refresh calls Gemini for every stage
+                response_cache_path=None if force_refresh else DEFAULT_RESPONSE_CACHE_PATH,
+                # Stage replies older than the report TTL would only rebuild the expired report
+                response_max_age=int(cache_ttl_hours * 3600)
+            )
+            set_session_jobs(session_jobs() + [job_id])
+
+    if session_jobs():
+        show_jobs()
+
+    prompt_tokens = st.session_state.pop("research_notice", None)
+    if prompt_tokens is not None:
+        st.success("✨ Research completed successfully!")
+        if prompt_tokens:
+            st.caption("Prompt tokens per stage: " + ", ".join(
+                f"{stage} {tokens:,}" for stage, tokens in prompt_tokens.items()
+            ))
 
     # Display reports
     report_container = st.container()
@@ -104,13 +353,14 @@ with tab1:
                     mime="text/markdown"
                 )
             with col2:
-                plain_text = format_to_plaintext(entry["report"])
+                plain_text = plain_text_of(entry)
                 st.download_button(
                     label="Download as Plain Text",
                     data=plain_text,
                     file_name=f"{entry['topic'].replace(' ', '_')}_report.txt",
                     mime="text/plain"
                 )
+            show_regenerate(entry, "current", api_key)
         
         # Show selected report from history if available
         elif "selected_report" in st.session_state:
@@ -131,7 +381,7 @@ with tab1:
                     key=f"selected_md"
                 )
             with col2:
-                plain_text = format_to_plaintext(entry["report"])
+                plain_text = plain_text_of(entry)
                 st.download_button(
                     label="Download TXT",
                     data=plain_text,
@@ -139,8 +389,12 @@ with tab1:
                     mime="text/plain",
                     key=f"selected_txt"
                 )
+            show_regenerate(entry, "selected", api_key)
 
 with tab2:
     show_documentation()
 
+with tab3:
+    show_performance_dashboard(db)
+
 create_footer()
\ No newline at end of file
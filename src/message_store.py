@@ -0,0 +1,82 @@
+import uuid
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage
+
+# Rough Gemini ratio; good enough for budgeting without a tokenizer round-trip
+CHARS_PER_TOKEN = 4
+
+# Per-agent prompt budgets in tokens for the conversation history
+DEFAULT_CONTEXT_BUDGETS = {
+    "researcher": 4000,
+    "analyst": 8000,
+    "writer": 16000,
+    "supervisor": 2000,
+}
+
+TRUNCATION_MARKER = "\n[... truncated to fit context budget]"
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a piece of text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def message_tokens(messages: List[BaseMessage]) -> int:
+    """Approximate token count of a list of messages."""
+    return sum(estimate_tokens(_text(m)) for m in messages)
+
+def append_messages(left: List[BaseMessage], right: List[BaseMessage]) -> List[BaseMessage]:
+    """Append-only, deduplicating reducer for AgentState.messages.
+
+    Messages are identified by id. Ids are assigned on first append, so a
+    message returned again by a later node is not stored twice.
+    """
+    seen = {m.id for m in left}
+    merged = list(left)
+    for message in right:
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+        elif message.id in seen:
+            continue
+        seen.add(message.id)
+        merged.append(message)
+    return merged
+
+def add_counts(left: Dict[str, int], right: Dict[str, int]) -> Dict[str, int]:
+    """Reducer summing per-stage counters."""
+    merged = dict(left or {})
+    for key, value in (right or {}).items():
+        merged[key] = merged.get(key, 0) + value
+    return merged
+
+def compact_messages(messages: List[BaseMessage], max_tokens: Optional[int],
+                     keep_first: int = 1, min_excerpt_tokens: int = 64) -> List[BaseMessage]:
+    """Fit a conversation into max_tokens.
+
+    The first keep_first messages (the task) are always kept. Newer turns are
+    kept whole, the oldest turn that no longer fits is cut to an excerpt and
+    anything older is dropped.
+    """
+    if max_tokens is None or message_tokens(messages) <= max_tokens:
+        return list(messages)
+
+    head = list(messages[:keep_first])
+    budget = max_tokens - message_tokens(head)
+    tail = []
+    for message in reversed(messages[keep_first:]):
+        cost = estimate_tokens(_text(message))
+        if cost <= budget:
+            tail.append(message)
+            budget -= cost
+            continue
+        if budget >= min_excerpt_tokens:
+            keep_chars = (budget - estimate_tokens(TRUNCATION_MARKER)) * CHARS_PER_TOKEN
+            tail.append(message.model_copy(update={"content": _text(message)[:keep_chars] + TRUNCATION_MARKER}))
+        break
+    return head + tail[::-1]
+
+def prompt_tokens(response, messages: List[BaseMessage]) -> int:
+    """Prompt tokens of a call: the model's own count when reported, else an estimate."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens") or message_tokens(messages)
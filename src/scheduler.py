@@ -0,0 +1,354 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Dict, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableLambda
+from message_store import message_tokens
+
+# Lower runs first; batch calls wait while interactive ones are queued
+PRIORITIES = {"interactive": 0, "batch": 1}
+# Gemini 2.5 Flash quotas on the first paid tier
+DEFAULT_REQUESTS_PER_MINUTE = 1000
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+DEFAULT_MAX_RETRIES = 4
+# HTTP statuses worth another attempt: timeouts, rate limits and server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Async waiters behind the head of the queue re-check this often
+ASYNC_POLL_SECONDS = 0.05
+# Queueing delays kept per priority for the percentiles in stats()
+DELAY_SAMPLES = 1000
+
+class TokenBucket:
+    """Allowance of per_minute units, refilled continuously.
+
+    The level may go negative when a call turns out to use more tokens than
+    estimated; later callers then wait for the debt to be refilled.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available; requests above the capacity wait for a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.per_minute) - self.level
+        return max(missing, 0) * 60 / self.per_minute
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.per_minute, self.level + amount)
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status of an API error or of the error it was raised from."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        for attribute in ("code", "status_code"):
+            status = getattr(error, attribute, None)
+            if isinstance(status, int):
+                return status
+        error = error.__cause__ or error.__context__
+    return None
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, timeouts, dropped connections and 5xx errors; not bad requests or bad keys."""
+    retryable = getattr(error, "is_retryable", None)
+    if isinstance(retryable, bool):
+        return retryable
+    status = status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+def priority_of(config: Optional[dict]) -> str:
+    """The run's priority, set as configurable["priority"] by stream_research_team."""
+    return ((config or {}).get("configurable") or {}).get("priority", "interactive")
+
+def _percentile(ordered: list, q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(max(math.ceil(q / 100 * len(ordered)), 1), len(ordered)) - 1]
+
+class CallScheduler:
+    """Process-wide gate for model calls: rate limits, priorities and retries.
+
+    Each call takes one request and its estimated prompt tokens from two token
+    buckets (requests_per_minute, tokens_per_minute; None for no limit) and
+    settles the estimate against the reported usage afterwards. Callers wait
+    in one queue ordered by priority, then arrival, so interactive runs go
+    ahead of batch runs, and only the head of the queue may take from the
+    buckets. Failures that is_retryable() accepts are retried up to
+    max_retries times after a full-jitter exponential backoff; a rate-limit
+    error also holds back every other caller for that long, so a burst
+    backs off together instead of retrying into the same quota.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: Optional[float] = DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = 1.0, max_delay: float = 30.0,
+                 rng: Optional[random.Random] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+        self.calls = Counter()
+        self.retries = Counter()
+        self.failures = Counter()
+        self.rate_limited = Counter()
+        self._delays: Dict[str, deque] = {}
+
+    def _ready(self, ticket: tuple) -> float:
+        """0 after taking ticket's allowance, else how long to wait before checking again. Hold _cond."""
+        if self._waiting[0] is not ticket:
+            # Woken by the grant that makes it the head
+            return 1.0
+        now = time.monotonic()
+        wait = max(
+            self._paused_until - now,
+            self.requests.wait_time(1, now) if self.requests else 0,
+            self.tokens.wait_time(ticket[2], now) if self.tokens else 0,
+        )
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiting)
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(ticket[2])
+        # The next caller in line is now the head
+        self._cond.notify_all()
+        return 0
+
+    def _enqueue(self, tokens: int, priority: str) -> tuple:
+        ticket = (PRIORITIES.get(priority, 0), next(self._order), tokens)
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _withdraw(self, ticket: tuple):
+        """Drop a caller that gave up waiting. Hold _cond."""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def _record_delay(self, priority: str, delay: float):
+        self._delays.setdefault(priority, deque(maxlen=DELAY_SAMPLES)).append(delay)
+
+    def acquire(self, tokens: int = 0, priority: str = "interactive") -> float:
+        """Block until a call of about tokens prompt tokens may start. Returns the seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(tokens, priority)
+            try:
+                while True:
+                    wait = self._ready(ticket)
+                    if not wait:
+                        break
+                    self._cond.wait(wait)
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+            delay = time.monotonic() - start
+            self._record_delay(priority, delay)
+        return delay
+
+    async def aacquire(self, tokens: int = 0, priority: str = "interactive") -> float:
+        """acquire() without blocking the event loop."""
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(tokens, priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._ready(ticket)
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, ASYNC_POLL_SECONDS))
+        except BaseException:
+            with self._cond:
+                self._withdraw(ticket)
+            raise
+        delay = time.monotonic() - start
+        with self._cond:
+            self._record_delay(priority, delay)
+        return delay
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Correct a call's token estimate once its usage is known."""
+        if self.tokens is None or actual is None:
+            return
+        with self._cond:
+            if actual > estimated:
+                self.tokens.take(actual - estimated)
+            else:
+                self.tokens.give(estimated - actual)
+                self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number attempt (0-based)."""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _failed(self, error: Exception, attempt: int, priority: str) -> Optional[float]:
+        """Seconds to wait before retrying after error, or None to give up."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            with self._cond:
+                self.failures[priority] += 1
+            # Recorded on the stage's telemetry span, as _finished does for replies
+            try:
+                error.retries = attempt
+            except AttributeError:
+                pass
+            return None
+        delay = self.backoff(attempt)
+        with self._cond:
+            self.retries[priority] += 1
+            if status_of(error) == 429 or type(error).__name__.endswith("RateLimitError"):
+                self.rate_limited[priority] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def _finished(self, response, tokens: int, priority: str, retries: int, delay: float):
+        with self._cond:
+            self.calls[priority] += 1
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.settle(tokens, usage.get("total_tokens"))
+        metadata = getattr(response, "response_metadata", None)
+        if isinstance(metadata, dict):
+            # Recorded on the stage's telemetry span
+            metadata["retries"] = retries
+            metadata["queue_delay"] = delay
+        return response
+
+    def call(self, fn: Callable, tokens: int = 0, priority: str = "interactive"):
+        """fn() once the limits allow, retrying retryable errors."""
+        delay = 0.0
+        for attempt in itertools.count():
+            delay += self.acquire(tokens, priority)
+            try:
+                response = fn()
+            except Exception as e:
+                self.settle(tokens, 0)
+                wait = self._failed(e, attempt, priority)
+                if wait is None:
+                    raise
+                time.sleep(wait)
+                continue
+            return self._finished(response, tokens, priority, attempt, delay)
+
+    async def acall(self, fn: Callable[[], Awaitable], tokens: int = 0, priority: str = "interactive"):
+        """Async call(): fn returns an awaitable and every wait is non-blocking."""
+        delay = 0.0
+        for attempt in itertools.count():
+            delay += await self.aacquire(tokens, priority)
+            try:
+                response = await fn()
+            except Exception as e:
+                self.settle(tokens, 0)
+                wait = self._failed(e, attempt, priority)
+                if wait is None:
+                    raise
+                await asyncio.sleep(wait)
+                continue
+            return self._finished(response, tokens, priority, attempt, delay)
+
+    def wrap(self, llm: BaseChatModel) -> Runnable:
+        """llm as a runnable whose calls go through this scheduler, at the priority in the run's config.
+
+        Streamed tokens still reach the run's callbacks; a call retried after
+        it started streaming streams its reply again.
+        """
+
+        def invoke(prompt, config):
+            messages = prompt.to_messages()
+            return self.call(lambda: llm.invoke(messages, config), message_tokens(messages), priority_of(config))
+
+        async def ainvoke(prompt, config):
+            messages = prompt.to_messages()
+            return await self.acall(lambda: llm.ainvoke(messages, config), message_tokens(messages),
+                                    priority_of(config))
+
+        return RunnableLambda(invoke, afunc=ainvoke, name="scheduled_model")
+
+    def stats(self) -> dict:
+        """Limits, queue length and per-priority calls, retries and queueing delay (ms) since startup."""
+        with self._cond:
+            priorities = sorted(set(self.calls) | set(self.failures) | set(self._delays),
+                                key=lambda p: PRIORITIES.get(p, 0))
+            delays = {p: sorted(self._delays.get(p, ())) for p in priorities}
+            return {
+                "requests_per_minute": self.requests.per_minute if self.requests else None,
+                "tokens_per_minute": self.tokens.per_minute if self.tokens else None,
+                "waiting": len(self._waiting),
+                "priorities": {
+                    p: {
+                        "calls": self.calls[p],
+                        "retries": self.retries[p],
+                        "rate_limited": self.rate_limited[p],
+                        "failures": self.failures[p],
+                        "queue_ms": {
+                            name: round(value * 1000, 1) if value is not None else None
+                            for name, value in (("p50", _percentile(delays[p], 50)),
+                                                ("p95", _percentile(delays[p], 95)),
+                                                ("max", delays[p][-1] if delays[p] else None))
+                        },
+                    }
+                    for p in priorities
+                },
+            }
+
+_scheduler: Optional[CallScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def _env_limit(name: str, default: float) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    # 0 turns the limit off
+    return float(value) or None
+
+def get_scheduler() -> CallScheduler:
+    """The process-wide scheduler, created on first use.
+
+    SEARCHPRO_REQUESTS_PER_MINUTE and SEARCHPRO_TOKENS_PER_MINUTE override the
+    limits (0 for none), SEARCHPRO_LLM_MAX_RETRIES the retry count.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CallScheduler(
+                requests_per_minute=_env_limit("SEARCHPRO_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE),
+                tokens_per_minute=_env_limit("SEARCHPRO_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE),
+                max_retries=int(os.getenv("SEARCHPRO_LLM_MAX_RETRIES") or DEFAULT_MAX_RETRIES),
+            )
+        return _scheduler
+
+def set_scheduler(scheduler: CallScheduler):
+    """Replace the process-wide scheduler, e.g. with an unlimited one for offline benchmarks.
+
+    Research teams compiled afterwards use it; agents.get_research_team keys
+    its compiled apps by scheduler, so none keeps the old one.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,362 @@
+"""Headless HTTP service: submit research, follow its progress and read reports.
+
+    python service.py --port 8080 --workers 4 --max-pending 32
+    python service.py --fake --fake-latency 0.5
+
+Endpoints (JSON unless noted):
+
+    POST /research            {"topic": "...", "routing": "rules", "research_fanout": 0, "force": false}
+    GET  /jobs/<id>           status and per-stage progress; ?live=1 adds the report written so far
+    GET  /jobs/<id>/events    Server-Sent Events: research events, then job_finished; ?tokens=0 skips tokens
+    GET  /reports/<id>        the report; ?format=markdown or ?format=text for the bare body
+    GET  /search?q=...        full-text search over stored reports
+    GET  /health              queue depth, limits and Gemini rate-limiter stats
+
+Runs execute on --workers job threads, queued in the research_jobs table
+(queue "service"), so the service shares reports and search with the app.
+Backpressure: POST /research answers 429 with Retry-After once --max-pending
+jobs are queued or running, event streams beyond --max-streams and
+connections beyond --max-connections get 503, and bodies are capped at
+64 KiB. Gemini is called with GOOGLE_API_KEY; --fake uses
+fakes.FakeChatModel instead, for offline load tests. There is no
+authentication, so keep the default loopback --host unless the service
+sits behind one.
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from agents import ROUTING_MODES
+from checkpoints import checkpoint_path_for
+from database import Database
+from events import coalesce_tokens, event_json
+from jobs import JobQueue
+from llm_cache import DEFAULT_RESPONSE_CACHE_PATH
+from scheduler import get_scheduler
+from stage_models import parse_stage_models
+from utils import format_to_plaintext
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_TOPIC_CHARS = 500
+MAX_RESEARCH_FANOUT = 8
+# Seconds between keep-alive comments on an idle event stream
+HEARTBEAT_SECONDS = 15.0
+
+class ResearchService:
+    """What every request handler shares: the database, the job queue and the limits.
+
+    Requests are answered from a stored report newer than cache_ttl seconds;
+    0 skips that lookup and None uses the database's own cache_ttl.
+    """
+
+    def __init__(self, db: Database, jobs: JobQueue, max_pending: int = 32, max_streams: int = 64,
+                 cache_ttl: Optional[int] = 24 * 3600, response_cache_path: Optional[str] = None):
+        self.db = db
+        self.jobs = jobs
+        self.max_pending = max_pending
+        self.max_streams = max_streams
+        self.cache_ttl = cache_ttl
+        self.response_cache_path = response_cache_path
+        self.streams = threading.BoundedSemaphore(max_streams)
+        # Makes the pending check and the submit one step
+        self._submit_lock = threading.Lock()
+
+    def submit(self, topic: str, routing: str, research_fanout: int, force: bool) -> Tuple[int, dict]:
+        """(HTTP status, body) for a research request."""
+        if not force and self.cache_ttl != 0:
+            cached = self.db.get_cached_research(topic, max_age=self.cache_ttl)
+            if cached:
+                return 200, {"status": "done", "cached": True, "research_id": cached["id"],
+                             "report_url": f"/reports/{cached['id']}"}
+        with self._submit_lock:
+            pending = self.jobs.pending()
+            if pending >= self.max_pending:
+                return 429, {"error": f"Too many research jobs pending ({pending}); retry later."}
+            # Stage replies older than the report TTL would only rebuild the expired report
+            job_id = self.jobs.submit(topic, routing=routing, research_fanout=research_fanout,
+                                      response_cache_path=None if force else self.response_cache_path,
+                                      response_max_age=self.cache_ttl)
+        return 202, {"status": "queued", "job_id": job_id, "status_url": f"/jobs/{job_id}",
+                     "events_url": f"/jobs/{job_id}/events"}
+
+class ResearchHTTPServer(ThreadingHTTPServer):
+    """Thread per connection, refusing connections beyond max_connections with a bare 503."""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service: ResearchService, max_connections: int = 256):
+        self.service = service
+        self.connections = threading.BoundedSemaphore(max_connections)
+        super().__init__(address, ResearchRequestHandler)
+
+    def process_request(self, request, client_address):
+        if not self.connections.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n"
+                                b"Retry-After: 1\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connections.release()
+
+class ResearchRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SearchPro/1.0"
+    protocol_version = "HTTP/1.1"
+    routes = [
+        ("GET", re.compile(r"/jobs/(\d+)"), "get_job"),
+        ("GET", re.compile(r"/jobs/(\d+)/events"), "stream_job"),
+        ("GET", re.compile(r"/reports/(\d+)"), "get_report"),
+        ("GET", re.compile(r"/search"), "search"),
+        ("GET", re.compile(r"/health"), "health"),
+        ("POST", re.compile(r"/research"), "submit"),
+    ]
+
+    @property
+    def service(self) -> ResearchService:
+        return self.server.service
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method: str):
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        allowed = []
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(url.path)
+            if match:
+                if route_method == method:
+                    return getattr(self, handler)(*match.groups())
+                allowed.append(route_method)
+        if allowed:
+            return self.send_json(405, {"error": f"Use {', '.join(allowed)}."}, [("Allow", ", ".join(allowed))])
+        self.send_json(404, {"error": "Not found."})
+
+    def param(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.query.get(name, [default])[0]
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: List[Tuple[str, str]] = ()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload, headers: List[Tuple[str, str]] = ()):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_body(status, body, "application/json; charset=utf-8", headers)
+
+    def read_json(self) -> Optional[dict]:
+        """The request's JSON object, or None after sending the error response."""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_json(413, {"error": f"Request bodies are limited to {MAX_BODY_BYTES} bytes."})
+            # The unread body would otherwise be parsed as the next request
+            self.close_connection = True
+            return None
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            self.send_json(400, {"error": "Send a JSON object."})
+            return None
+        return payload
+
+    def submit(self):
+        payload = self.read_json()
+        if payload is None:
+            return
+        topic = payload.get("topic")
+        routing = payload.get("routing", "rules")
+        research_fanout = payload.get("research_fanout", 0)
+        if not isinstance(topic, str) or not topic.strip() or len(topic) > MAX_TOPIC_CHARS:
+            return self.send_json(400, {"error": f"topic must be 1 to {MAX_TOPIC_CHARS} characters."})
+        if routing not in ROUTING_MODES:
+            return self.send_json(400, {"error": f"routing must be one of {', '.join(ROUTING_MODES)}."})
+        if not isinstance(research_fanout, int) or not 0 <= research_fanout <= MAX_RESEARCH_FANOUT:
+            return self.send_json(400, {"error": f"research_fanout must be 0 to {MAX_RESEARCH_FANOUT}."})
+        status, body = self.service.submit(topic.strip(), routing, research_fanout, bool(payload.get("force")))
+        headers = []
+        if status == 202:
+            headers.append(("Location", body["status_url"]))
+        elif status == 429:
+            headers.append(("Retry-After", "5"))
+        self.send_json(status, body, headers)
+
+    def get_job(self, job_id: str):
+        job = self.service.jobs.get(int(job_id))
+        if job is None:
+            return self.send_json(404, {"error": "No such job."})
+        if self.param("live") != "1":
+            del job["live_report"]
+        self.send_json(200, job)
+
+    def stream_job(self, job_id: str):
+        """Server-Sent Events for one job, from its current state until it finishes."""
+        job_id = int(job_id)
+        if not self.service.streams.acquire(blocking=False):
+            return self.send_json(503, {"error": "Too many open event streams."}, [("Retry-After", "5")])
+        jobs = self.service.jobs
+        # Subscribe before reading the job, so nothing between the two is missed
+        events = jobs.subscribe(job_id)
+        try:
+            job = jobs.get(job_id)
+            if job is None:
+                return self.send_json(404, {"error": "No such job."})
+            tokens = self.param("tokens", "1") != "0"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            del job["live_report"]
+            self.write_event("job", json.dumps(job, ensure_ascii=False, default=str))
+            if job["status"] in ("done", "failed"):
+                return
+            while True:
+                try:
+                    batch = [events.get(timeout=HEARTBEAT_SECONDS)]
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                # Whatever queued up meanwhile goes out together, tokens merged
+                while True:
+                    try:
+                        batch.append(events.get_nowait())
+                    except queue.Empty:
+                        break
+                # The batch is already one write, so consecutive tokens always merge
+                for event in coalesce_tokens(batch, min_interval=float("inf")):
+                    if event["type"] == "token" and not tokens:
+                        continue
+                    self.write_event(event["type"], event_json(event))
+                    if event["type"] == "job_finished":
+                        return
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            # The client went away; the job carries on
+            pass
+        finally:
+            jobs.unsubscribe(job_id, events)
+            self.service.streams.release()
+
+    def write_event(self, name: str, data: str):
+        self.wfile.write(f"event: {name}\ndata: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def get_report(self, research_id: str):
+        report = self.service.db.get_report(int(research_id))
+        if report is None:
+            return self.send_json(404, {"error": "No such report."})
+        fmt = self.param("format", "json")
+        if fmt == "markdown":
+            return self.send_body(200, report["report"].encode("utf-8"), "text/markdown; charset=utf-8")
+        if fmt == "text":
+            return self.send_body(200, format_to_plaintext(report["report"]).encode("utf-8"),
+                                  "text/plain; charset=utf-8")
+        self.send_json(200, report)
+
+    def search(self):
+        query = self.param("q", "")
+        try:
+            limit = min(max(int(self.param("limit", "20")), 1), 50)
+        except ValueError:
+            return self.send_json(400, {"error": "limit must be a number."})
+        if not query.strip():
+            return self.send_json(400, {"error": "Pass the search words as q."})
+        self.send_json(200, {"query": query, "results": self.service.db.search_research(query, limit=limit)})
+
+    def health(self):
+        service = self.service
+        self.send_json(200, {
+            "status": "ok",
+            "pending_jobs": service.jobs.pending(),
+            "max_pending": service.max_pending,
+            "workers": service.jobs.workers,
+            "max_streams": service.max_streams,
+            "scheduler": get_scheduler().stats(),
+        })
+
+def create_server(db: Database, jobs: JobQueue, host: str = "127.0.0.1", port: int = 8080,
+                  max_pending: int = 32, max_streams: int = 64, max_connections: int = 256,
+                  cache_ttl: Optional[int] = 24 * 3600,
+                  response_cache_path: Optional[str] = DEFAULT_RESPONSE_CACHE_PATH) -> ResearchHTTPServer:
+    """A bound, not yet serving, server; call serve_forever() and start the job queue."""
+    service = ResearchService(db, jobs, max_pending=max_pending, max_streams=max_streams,
+                              cache_ttl=cache_ttl, response_cache_path=response_cache_path)
+    return ResearchHTTPServer((host, port), service, max_connections=max_connections)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve the research pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default="research_cache.db", help="SQLite cache path")
+    parser.add_argument("--workers", type=int, default=4, help="research runs in flight at once")
+    parser.add_argument("--max-pending", type=int, default=32, help="queued plus running jobs before 429s")
+    parser.add_argument("--max-streams", type=int, default=64, help="concurrent event streams")
+    parser.add_argument("--max-connections", type=int, default=256, help="concurrent connections")
+    parser.add_argument("--cache-ttl-hours", type=float, default=24,
+                        help="answer from a stored report newer than this; 0 skips the cache lookup "
+                             "and always runs the research")
+    parser.add_argument("--llm-cache", default=DEFAULT_RESPONSE_CACHE_PATH, help="SQLite memo of stage replies")
+    parser.add_argument("--no-llm-cache", action="store_true", help="call the model for every stage")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake chat model")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--stage-models", type=parse_stage_models, default=None,
+                        help='per-agent models as JSON, e.g. \'{"writer": {"model": "gemini-2.5-pro"}}\'')
+    parser.add_argument("--latency-budget", type=float, default=None,
+                        help="seconds per run before later stages switch to their fallback model")
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    args = parser.parse_args(argv)
+
+    llm = None
+    if args.fake:
+        from fakes import FakeChatModel
+        llm = FakeChatModel(latency=args.fake_latency)
+    elif not os.getenv("GOOGLE_API_KEY"):
+        parser.error("set GOOGLE_API_KEY or pass --fake")
+    if args.quiet:
+        ResearchRequestHandler.log_message = lambda *a, **k: None
+
+    db = Database(args.db)
+    jobs = JobQueue(db, workers=args.workers, name="service", checkpoint_path=checkpoint_path_for(args.db), llm=llm,
+                    stage_models=args.stage_models, latency_budget=args.latency_budget)
+    server = create_server(
+        db, jobs, host=args.host, port=args.port, max_pending=args.max_pending, max_streams=args.max_streams,
+        max_connections=args.max_connections,
+        cache_ttl=int(args.cache_ttl_hours * 3600) if args.cache_ttl_hours > 0 else 0,
+        response_cache_path=None if args.no_llm_cache else args.llm_cache
+    )
+    jobs.start()
+    print(f"Serving on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Running jobs are picked up again, from their checkpoints, on the next start
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import hashlib
+import struct
+from typing import List, Set
+
+# 48 MinHash permutations in 16 LSH bands of 3 rows, so the band match curve turns
+# at (1/16)^(1/3) ~ 0.4, the default similarity threshold: topics with a Jaccard
+# similarity of 0.6 share a band ~98% of the time, 0.4 ~65%, 0.2 only ~12%.
+NUM_PERM = 48
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def _seeded(seed: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"searchpro-minhash-{seed}".encode(), digest_size=8).digest(), "big")
+
+# Fixed permutations so signatures stay comparable across processes and releases
+_PERMUTATIONS = [(_seeded(2 * i) % _MERSENNE_PRIME | 1, _seeded(2 * i + 1) % _MERSENNE_PRIME)
+                 for i in range(NUM_PERM)]
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from how in into is it its of on or s the their this to vs what when
+which who why will with
+""".split())
+
+def _stem(word: str) -> str:
+    """Crude suffix folding so inflections of a word share shingles."""
+    for suffix in ("ments", "ment", "ations", "ation", "ings", "ing", "ies", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def topic_shingles(normalized_topic: str) -> Set[str]:
+    """Word and character 3-gram shingles of a normalized topic, ignoring stopwords and word order."""
+    words = [_stem(w) for w in normalized_topic.split() if w not in STOPWORDS]
+    shingles = {f"w:{w}" for w in words}
+    for word in words:
+        padded = f" {word} "
+        shingles.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return shingles
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def minhash_signature(shingles: Set[str]) -> List[int]:
+    """MinHash signature of NUM_PERM 32-bit values."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles] or [0]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+def lsh_bands(signature: List[int]) -> List[int]:
+    """One signed 64-bit key per band, ready for an indexed INTEGER column."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f">I{ROWS_PER_BAND}I", band, *rows), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+def band_keys(normalized_topic: str) -> List[int]:
+    return lsh_bands(minhash_signature(topic_shingles(normalized_topic)))
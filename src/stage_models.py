@@ -0,0 +1,69 @@
+import json
+import time
+from typing import Dict, Optional
+from typing_extensions import TypedDict
+
+STAGES = ("supervisor", "researcher", "analyst", "writer")
+# Used by a stage once its run falls behind the latency budget
+DEFAULT_FALLBACK_MODEL = "gemini-2.5-flash-lite"
+# Share of a run's latency budget each stage is expected to take, in pipeline order
+LATENCY_BUDGET_SHARES = {
+    "researcher": 0.4,
+    "analyst": 0.3,
+    "writer": 0.3,
+}
+
+class StageModel(TypedDict, total=False):
+    """Model settings of one agent; unset keys keep the defaults."""
+    model: str
+    temperature: float
+    # Model used instead once the run is behind its latency budget; None never downgrades
+    fallback: Optional[str]
+
+def resolve_stage_models(overrides: Optional[Dict[str, StageModel]], model: str,
+                         temperature: float) -> Dict[str, StageModel]:
+    """Complete settings for every stage: overrides on top of model, temperature and the default fallback."""
+    overrides = overrides or {}
+    unknown = set(overrides) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}. Expected some of {STAGES}")
+    return {
+        stage: {"model": model, "temperature": temperature, "fallback": DEFAULT_FALLBACK_MODEL,
+                **overrides.get(stage, {})}
+        for stage in STAGES
+    }
+
+def stage_models_key(stage_models: Optional[Dict[str, StageModel]]) -> tuple:
+    """Hashable form of stage_models, for registry keys."""
+    return tuple(sorted((stage, tuple(sorted(settings.items())))
+                        for stage, settings in (stage_models or {}).items()))
+
+def parse_stage_models(text: Optional[str]) -> Optional[Dict[str, StageModel]]:
+    """Stage settings from JSON, e.g. '{"writer": {"model": "gemini-2.5-pro", "temperature": 0.3}}'."""
+    if not text:
+        return None
+    stage_models = json.loads(text)
+    if not isinstance(stage_models, dict) or not all(isinstance(s, dict) for s in stage_models.values()):
+        raise ValueError("Stage models must be a JSON object of {stage: {model, temperature, fallback}}")
+    for stage, settings in stage_models.items():
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}. Expected one of {STAGES}")
+        unknown = set(settings) - set(StageModel.__annotations__)
+        if unknown:
+            raise ValueError(f"Unknown settings for {stage}: {', '.join(sorted(unknown))}")
+    return stage_models
+
+def behind_budget(stage: str, config: Optional[dict]) -> bool:
+    """Whether the run has used more of its latency budget than the stages before stage should have.
+
+    The budget and start time are configurable["latency_budget"] and
+    configurable["run_started_at"], set by stream_research_team. The first
+    stage, and stages outside LATENCY_BUDGET_SHARES, are never behind.
+    """
+    configurable = (config or {}).get("configurable") or {}
+    budget, started = configurable.get("latency_budget"), configurable.get("run_started_at")
+    if not budget or started is None or stage not in LATENCY_BUDGET_SHARES:
+        return False
+    stages = list(LATENCY_BUDGET_SHARES)
+    expected = sum(LATENCY_BUDGET_SHARES[s] for s in stages[:stages.index(stage)])
+    return expected > 0 and time.time() - started > budget * expected
@@ -0,0 +1,65 @@
+import time
+import uuid
+from typing import Optional
+from typing_extensions import TypedDict
+
+# USD per million (prompt, completion) tokens, for cost estimates
+MODEL_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+DEFAULT_PRICE = MODEL_PRICES["gemini-2.5-flash"]
+
+class Span(TypedDict):
+    """Timing of one agent node or supervisor decision within a run."""
+    span_id: str
+    run_id: Optional[str]
+    topic: str
+    node: str
+    started_at: float
+    duration: float
+    prompt_tokens: int
+    completion_tokens: int
+    retries: int
+    error: Optional[str]
+    model: Optional[str]
+
+def run_id_of(config: Optional[dict]) -> Optional[str]:
+    """The run a node executes in: its LangGraph thread id."""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+def make_span(node: str, state: dict, config: Optional[dict], started_at: float, start: float,
+              response=None, error: Optional[Exception] = None) -> Span:
+    """Close a span opened at started_at (wall clock) / start (perf_counter).
+
+    Token counts come from the model's usage_metadata and are 0 when the
+    response carries none, came from the response cache, or the node made no
+    LLM call.
+    """
+    metadata = getattr(response, "response_metadata", None) or {}
+    # Replies served from the response cache cost nothing
+    usage = {} if metadata.get("cached") else getattr(response, "usage_metadata", None) or {}
+    return {
+        "span_id": uuid.uuid4().hex,
+        "run_id": run_id_of(config),
+        "topic": state.get("research_topic", ""),
+        "node": node,
+        "started_at": started_at,
+        "duration": time.perf_counter() - start,
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "completion_tokens": usage.get("output_tokens", 0),
+        # The scheduler sets retries on the reply, or on the error it gave up with
+        "retries": metadata.get("retries", getattr(error, "retries", 0)),
+        "error": f"{type(error).__name__}: {error}" if error else None,
+        "model": metadata.get("model_name"),
+    }
+
+def span_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call, priced as gemini-2.5-flash when the model is unknown."""
+    prompt_price, completion_price = next(
+        (price for name, price in sorted(MODEL_PRICES.items(), key=lambda item: -len(item[0]))
+         if model and name in model),
+        DEFAULT_PRICE
+    )
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
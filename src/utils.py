@@ -1,51 +1,176 @@
 import re
-from typing import Dict, Any
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator
 import streamlit as st
 
+# Every markdown construct the converter handles, as alternatives of one pattern, so a
+# report is converted in a single left-to-right scan. Line-level tokens are anchored
+# with ^; fenced code is matched as a whole block, so nothing inside it is touched.
+# The leading check lets the scan skip ordinary characters without trying each alternative.
+# Link and emphasis text is capped at 500 characters, so an unmatched [, * or _ looks
+# ahead a bounded distance instead of to the end of its line, keeping the scan linear.
+_MARKDOWN_TOKEN = re.compile(r"""
+  (?:^|(?=[`!\[\\*_~]))
+  (?:
+    (?P<fenced>^[ \t]{0,3}(?P<fence>`{3,}|~{3,})[^\n]*\n
+        (?P<code_block>(?s:.*?))
+        (?:^[ \t]{0,3}(?P=fence)[`~]*[ \t]*$|\Z))
+  | ^[ \t]{0,3}(?:(?:[-*_][ \t]*){3,}|=+[ \t]*)$
+  | (?P<heading_line>^[ \t]{0,3}\#{1,6}(?:[ \t]+|$)(?P<heading>[^\n]*?)(?:[ \t]+\#+)?[ \t]*$)
+  | (?P<list_item>^(?P<indent>[ \t]*)(?:(?:>[ \t]?)+[ \t]*)?(?:[*+-]|\d{1,9}[.)])[ \t]+)
+  | ^[ \t]*(?:>[ \t]?)+
+  | (?P<code_span>(?P<ticks>`+)(?P<code>[^\n]+?)(?P=ticks))
+  | (?P<link>!?\[(?P<link_text>[^\]\n]{0,500})\]\((?P<url>[^)\s]*)(?:[ \t]+"[^"\n]*")?\))
+  | (?P<escape>\\(?P<escaped>[\\`*_{}\[\]()#+\-.!~>|]))
+  | (?P<emphasis>(?<![\w\\*])(?P<stars>\*{1,3})(?=\S)(?P<starred>[^\n]{0,500}?\S)(?P=stars)(?![\w*])
+        | (?<![\w\\])(?P<underscores>_{1,3})(?=\S)(?P<underscored>[^\n]{0,500}?\S)(?P=underscores)(?!\w))
+  | ~~
+  )
+""", re.MULTILINE | re.VERBOSE)
+
+_TOKEN_TEXT: Dict[str, Callable[[re.Match], str]] = {
+    "fenced": lambda match: match.group("code_block").rstrip("\n"),
+    "heading_line": lambda match: _convert_inline(match.group("heading")),
+    "list_item": lambda match: match.group("indent"),
+    "code_span": lambda match: match.group("code"),
+    "link": lambda match: match.group("link_text") or match.group("url"),
+    "escape": lambda match: match.group("escaped"),
+    "emphasis": lambda match: _convert_inline(match.group("starred") or match.group("underscored")),
+}
+
+def _markdown_token(match: re.Match) -> str:
+    # Markers without a named group (quotes, rules, strikethrough) are dropped
+    handler = _TOKEN_TEXT.get(match.lastgroup)
+    return handler(match) if handler else ""
+
+def _convert_inline(text: str) -> str:
+    return _MARKDOWN_TOKEN.sub(_markdown_token, text)
+
+# Runs of blank lines, including the ones left where rules were removed
+_BLANK_LINES = re.compile(r"\n[ \t]*\n(?:[ \t]*\n)*")
+_LEADING_BLANK_LINES = re.compile(r"(?:[ \t]*\n)*")
+
+def _convert_markdown(markdown_text: str) -> str:
+    return _BLANK_LINES.sub("\n\n", _MARKDOWN_TOKEN.sub(_markdown_token, markdown_text))
+
+_FENCE_LINE = re.compile(r"^[ \t]{0,3}(`{3,}|~{3,})", re.MULTILINE)
+
+class PlaintextConverter:
+    """Incremental markdown-to-plaintext conversion for streamed or very long reports.
+
+    feed() takes any chunk of markdown (e.g. streamed tokens) and returns the
+    plain text of the lines it completed; close() flushes the rest. Complete
+    lines are converted as soon as they arrive, except an open code fence,
+    which waits for its closing fence. Joined, the output equals
+    format_to_plaintext() of the whole text.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._fence = None
+        self._fence_start = 0
+        self._scanned = 0
+        self._started = False
+        self._held = ""
+
+    def _scan_fences(self, end: int):
+        """Track whether a code fence is open at end, from where the last scan stopped."""
+        for match in _FENCE_LINE.finditer(self._pending, self._scanned, end):
+            marker = match.group(1)
+            if self._fence is None:
+                self._fence, self._fence_start = marker, match.start()
+            elif marker[0] == self._fence[0] and len(marker) >= len(self._fence):
+                self._fence = None
+        self._scanned = end
+
+    def _emit(self, text: str) -> str:
+        """Collapse blank lines across chunk boundaries and hold back trailing whitespace."""
+        if not self._started:
+            text = text.lstrip()
+        body = text.rstrip()
+        if not body:
+            self._held += text
+            return ""
+        leading = _LEADING_BLANK_LINES.match(body).end()
+        gap = _BLANK_LINES.sub("\n\n", self._held + body[:leading])
+        self._started = True
+        self._held = text[len(body):]
+        return gap + body[leading:]
+
+    def feed(self, chunk: str) -> str:
+        self._pending += chunk
+        cut = self._pending.rfind("\n") + 1
+        if cut <= self._scanned:
+            return ""
+        self._scan_fences(cut)
+        if self._fence is not None:
+            # Convert up to the open fence; the block is converted once it closes
+            cut = self._fence_start
+        text, self._pending = self._pending[:cut], self._pending[cut:]
+        self._scanned -= cut
+        self._fence_start -= cut
+        return self._emit(_convert_markdown(text)) if text else ""
+
+    def close(self) -> str:
+        text, self._pending = self._pending, ""
+        self._fence, self._scanned, self._fence_start = None, 0, 0
+        return self._emit(_convert_markdown(text)) if text else ""
+
+def iter_plaintext(chunks: Iterable[str]) -> Iterator[str]:
+    """Convert streamed markdown chunks, yielding plain text as lines complete."""
+    converter = PlaintextConverter()
+    for chunk in chunks:
+        text = converter.feed(chunk)
+        if text:
+            yield text
+    text = converter.close()
+    if text:
+        yield text
+
 def format_to_plaintext(markdown_text: str) -> str:
-    """Processes and parses markdown text to remove formatting."""
-    # Remove headings
-    text = re.sub(r'#+\s', '', markdown_text)
-    # Remove horizontal rules
-    text = re.sub(r'\n---\n', '\n', text)
-    # Remove bold and italics
-    text = re.sub(r'\*\*(.*?)\*\*|__(.*?)__', r'\1\2', text)
-    text = re.sub(r'\*(.*?)\*|_(.*?)_', r'\1\2', text)
-    # Remove list items
-    text = re.sub(r'^\s*[\*\-\+]\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
-    # Remove blockquotes and code blocks
-    text = re.sub(r'^>\s*', '', text, flags=re.MULTILINE)
-    text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
-    text = re.sub(r'`(.*?)`', r'\1', text)
-    # Clean up extra newlines
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    return text.strip()
-
-def process_research_callback(state: Dict[str, Any], spinners: Dict[str, Any]) -> None:
-    """Handle research process callbacks and update UI."""
-    current_agent = state.get("current_agent", "")
-    
-    if current_agent == "researcher":
-        with spinners["research"]:
-            st.info("🔍 Research Specialist is gathering information...")
-            if state.get("findings", {}).get("research"):
-                st.success("✅ Research phase completed")
-    
-    elif current_agent == "analyst":
-        with spinners["research"]:
-            st.success("✅ Research phase completed")
-        with spinners["analysis"]:
-            st.info("📊 Data Analyst is processing information...")
-            if state.get("findings", {}).get("analysis"):
-                st.success("✅ Analysis phase completed")
-    
-    elif current_agent == "writer":
-        with spinners["research"]:
-            st.success("✅ Research phase completed")
-        with spinners["analysis"]:
-            st.success("✅ Analysis phase completed")
-        with spinners["writing"]:
-            st.info("📝 Report Writer is composing the final document...")
-            if state.get("final_report"):
-                st.success("✅ Writing phase completed")
\ No newline at end of file
+    """Processes and parses markdown text to remove formatting.
+
+    Emphasis markers are only removed in matched pairs:
+
+    >>> format_to_plaintext("**Bold**, *italic* and __strong__ _text_")
+    'Bold, italic and strong text'
+    >>> format_to_plaintext("O(n*m), use 2*x, Rated 4.5*, up 5%* and snake_case_name")
+    'O(n*m), use 2*x, Rated 4.5*, up 5%* and snake_case_name'
+    """
+    return _convert_markdown(markdown_text).strip()
+
+# Messages per pipeline stage while it runs and once it completes
+STAGE_MESSAGES = {
+    "research": ("🔍 Research Specialist is gathering information...", "✅ Research phase completed"),
+    "analysis": ("📊 Data Analyst is processing information...", "✅ Analysis phase completed"),
+    "writing": ("📝 Report Writer is composing the final document...", "✅ Writing phase completed"),
+}
+
+def show_job_progress(stages: Dict[str, str]) -> None:
+    """Show each pipeline stage of a research job as running, completed or failed."""
+    for stage, (running, done) in STAGE_MESSAGES.items():
+        status = stages.get(stage)
+        if status == "running":
+            st.info(running)
+        elif status == "done":
+            st.success(done)
+        elif status == "failed":
+            st.error(f"❌ {stage.capitalize()} phase failed")
+
+def create_token_renderer(placeholder: Any, min_interval: float = 0.1) -> Callable[[str], None]:
+    """Build an on_token callback that renders streamed report text into a placeholder.
+
+    Redraws are throttled to one every min_interval seconds so long reports
+    don't re-render markdown for every token.
+    """
+    chunks = []
+    last_render = [0.0]
+
+    def render_token(token: str) -> None:
+        chunks.append(token)
+        now = time.monotonic()
+        if now - last_render[0] >= min_interval:
+            last_render[0] = now
+            placeholder.markdown("".join(chunks) + " ▌")
+
+    return render_token
\ No newline at end of file
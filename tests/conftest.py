@@ -0,0 +1,29 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules in src/ import each other by bare name, as when run from src/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import scheduler  # noqa: E402
+from database import Database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "research_cache.db"))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def unlimited_scheduler():
+    """An unlimited process-wide scheduler with near-instant retries, restored afterwards."""
+    previous = scheduler._scheduler
+    replacement = scheduler.CallScheduler(requests_per_minute=None, tokens_per_minute=None,
+                                          base_delay=0.001, max_delay=0.001, rng=random.Random(0))
+    scheduler.set_scheduler(replacement)
+    yield replacement
+    scheduler._scheduler = previous
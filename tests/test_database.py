@@ -0,0 +1,83 @@
+import sqlite3
+
+from database import SCHEMA_VERSION, Database
+
+# research_cache as the first release of the app created it
+BASELINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS research_cache (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    report TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_topic ON research_cache(topic);
+"""
+
+
+def test_migrates_baseline_database(tmp_path):
+    path = str(tmp_path / "research_cache.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany("INSERT INTO research_cache (topic, report) VALUES (?, ?)", [
+            ("Solar storage", "# Solar\n\nBattery costs keep falling."),
+            ("AI jobs", "# Jobs\n\nAutomation reshapes clerical work."),
+            ("ai jobs!", "# Jobs\n\nAutomation reshapes clerical work."),
+        ])
+    conn.close()
+
+    db = Database(path)
+    try:
+        with sqlite3.connect(path) as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        conn.close()
+        assert db.get_cached_research("solar storage")["report"] == "# Solar\n\nBattery costs keep falling."
+        # Equivalent spellings resolve to the newest of them
+        assert db.get_cached_research("AI Jobs")["topic"] == "ai jobs!"
+        assert {row["topic"] for row in db.get_recent_research()} == {"Solar storage", "AI jobs", "ai jobs!"}
+        assert [hit["topic"] for hit in db.search_research("battery")] == ["Solar storage"]
+        stats = db.storage_stats()
+        assert (stats["reports"], stats["unique_reports"]) == (3, 2)
+    finally:
+        db.close()
+
+
+def test_migration_is_idempotent(tmp_path):
+    path = str(tmp_path / "research_cache.db")
+    Database(path).close()
+    db = Database(path)
+    try:
+        db.cache_research("Solar storage", "report")
+        assert db.get_cached_research("Solar storage")["report"] == "report"
+    finally:
+        db.close()
+
+
+def test_fingerprint_falls_back_to_older_spelling_after_delete(db):
+    db.cache_research("AI jobs", "older")
+    newest = db.cache_research("ai jobs!", "newer")
+    assert db.get_cached_research("AI jobs")["report"] == "newer"
+
+    db._write(lambda conn: db._delete_reports(conn, [newest]))
+
+    assert db.get_cached_research("AI jobs")["report"] == "older"
+    assert db.find_similar_research("AI jobs")
+
+
+def test_identical_reports_and_findings_are_stored_once(db):
+    findings = {
+        "research": {"research_overview": "r" * 5000, "sources": ["not stored"]},
+        "analysis": {"analysis_summary": "a" * 5000},
+    }
+    first = db.cache_research("Solar storage", "x" * 10000, findings)
+    db.cache_research("Solar storage trends", "x" * 10000, findings)
+
+    assert db.get_findings(first) == {
+        "research": {"research_overview": "r" * 5000},
+        "analysis": {"analysis_summary": "a" * 5000},
+    }
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM report_blobs").fetchone()[0] == 2
+    conn.close()
+    stats = db.storage_stats()
+    assert stats["unique_reports"] == 1
+    assert stats["findings_bytes"] > 0
@@ -0,0 +1,51 @@
+import asyncio
+
+from agents import run_research_team
+from batch import run_batch
+from fakes import FakeChatModel
+
+
+class FailingPlanner(FakeChatModel):
+    def _reply(self, messages):
+        if "numbered list of questions" in str(messages[0].content):
+            raise ValueError("planner down")
+        return super()._reply(messages)
+
+
+def test_fake_model_run_produces_report(unlimited_scheduler):
+    result = run_research_team("Solar storage", llm=FakeChatModel(output_chars=300), checkpoint_path=None)
+
+    assert result["final_report"]
+    assert not result.get("failed_stages")
+    assert {"researcher", "analyst", "writer"} <= {span["node"] for span in result["spans"]}
+
+
+def test_fanout_run_researches_each_sub_question(unlimited_scheduler):
+    result = run_research_team("Solar storage", llm=FakeChatModel(output_chars=300), checkpoint_path=None,
+                               research_fanout=3)
+
+    assert result["final_report"]
+    assert [span["node"] for span in result["spans"]].count("research_branch") == 3
+
+
+def test_planner_failure_is_recorded(unlimited_scheduler):
+    result = run_research_team("Solar storage", llm=FailingPlanner(output_chars=300), checkpoint_path=None,
+                               research_fanout=3)
+
+    assert result["failed_stages"] == ["researcher"]
+    planner = next(span for span in result["spans"] if span["node"] == "researcher")
+    assert planner["error"] == "ValueError: planner down"
+    # The topic is still researched, as a single branch
+    assert result["final_report"]
+
+
+def test_batch_writes_reports_and_skips_cached_topics(db, unlimited_scheduler):
+    topics = ["Solar storage", "AI jobs", "Grid batteries"]
+    llm = FakeChatModel(output_chars=300)
+
+    summary = asyncio.run(run_batch(topics, db, concurrency=2, llm=llm, checkpoint_path=None))
+    assert (summary["succeeded"], summary["failed"], summary["written"]) == (3, 0, 3)
+    assert db.get_cached_research("ai jobs")["report"]
+
+    summary = asyncio.run(run_batch(topics + ["Heat pumps"], db, concurrency=2, llm=llm, checkpoint_path=None))
+    assert (summary["skipped_cached"], summary["written"]) == (3, 1)
@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+
+import pytest
+
+from scheduler import CallScheduler
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def fast_scheduler(**kwargs):
+    return CallScheduler(requests_per_minute=None, tokens_per_minute=None, base_delay=0.001,
+                         max_delay=0.001, rng=random.Random(0), **kwargs)
+
+
+def test_interactive_calls_go_ahead_of_queued_batch_calls():
+    scheduler = fast_scheduler()
+    # Hold the queue, as after a rate limit, until every caller is waiting
+    scheduler._paused_until = time.monotonic() + 0.3
+    order = []
+
+    def call(name, priority):
+        scheduler.call(lambda: order.append(name), priority=priority)
+
+    threads = [threading.Thread(target=call, args=(f"batch-{i}", "batch")) for i in range(3)]
+    threads.append(threading.Thread(target=call, args=("interactive", "interactive")))
+    for queued, thread in enumerate(threads, 1):
+        thread.start()
+        # Start the next caller only once this one is queued, so the batch calls arrive first
+        while len(scheduler._waiting) < queued:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["interactive", "batch-0", "batch-1", "batch-2"]
+
+
+def test_rate_limited_call_backs_off_and_succeeds():
+    scheduler = fast_scheduler()
+    attempts = []
+
+    class Reply:
+        response_metadata = {}
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RateLimited("quota exceeded")
+        return Reply()
+
+    reply = scheduler.call(flaky, priority="batch")
+
+    assert len(attempts) == 3
+    assert reply.response_metadata["retries"] == 2
+    stats = scheduler.stats()["priorities"]["batch"]
+    assert (stats["calls"], stats["retries"], stats["rate_limited"], stats["failures"]) == (1, 2, 2, 0)
+
+
+def test_rate_limit_pauses_other_callers():
+    scheduler = CallScheduler(requests_per_minute=None, tokens_per_minute=None, base_delay=0.2,
+                              max_delay=0.2, rng=random.Random(0))
+    scheduler._failed(RateLimited("quota exceeded"), 0, "interactive")
+
+    assert scheduler.acquire() > 0
+
+
+def test_gives_up_after_max_retries_and_records_them():
+    scheduler = fast_scheduler(max_retries=2)
+
+    def always_limited():
+        raise RateLimited("quota exceeded")
+
+    with pytest.raises(RateLimited) as raised:
+        scheduler.call(always_limited)
+
+    assert raised.value.retries == 2
+    assert scheduler.stats()["priorities"]["interactive"]["failures"] == 1
+
+
+def test_does_not_retry_bad_requests():
+    scheduler = fast_scheduler()
+    attempts = []
+
+    def bad():
+        attempts.append(1)
+        raise BadRequest("invalid argument")
+
+    with pytest.raises(BadRequest):
+        scheduler.call(bad)
+
+    assert len(attempts) == 1
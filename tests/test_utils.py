@@ -0,0 +1,26 @@
+import time
+
+import pytest
+
+from utils import format_to_plaintext, iter_plaintext
+
+
+def test_converts_paired_markers():
+    text = "# Title\n\n**Bold** and [a link](https://example.com) with `code`\n"
+    assert format_to_plaintext(text) == "Title\n\nBold and a link with code"
+
+
+def test_stream_matches_whole_text():
+    text = "## Summary\n\n- *one*\n- _two_\n\n```\n**kept**\n```\nDone [x](y)\n"
+    chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+    assert "".join(iter_plaintext(chunks)) == format_to_plaintext(text)
+
+
+@pytest.mark.parametrize("marker", ["_a ", "*a ", "[a "])
+def test_unmatched_markers_convert_in_linear_time(marker):
+    # Each unmatched marker used to look ahead to the end of the line, so one
+    # 60 KB line of them took over ten seconds
+    text = marker * 20000
+    start = time.perf_counter()
+    assert format_to_plaintext(text) == text.strip()
+    assert time.perf_counter() - start < 3